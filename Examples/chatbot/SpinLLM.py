@@ -1,13 +1,385 @@
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple, Union
+from collections import OrderedDict
 from langchain.chat_models.base import BaseChatModel
 from langchain.messages import AIMessage, HumanMessage, SystemMessage, ToolCall, ToolMessage
-from langchain_core.messages import BaseMessage
+from langchain_core.messages import AIMessageChunk, BaseMessage
+from langchain_core.messages.tool import tool_call_chunk
 from langchain_core.outputs.chat_result import ChatResult
-from langchain_core.outputs import ChatGeneration
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk
 from SpiLLI.SpinLLI import Spin
+from pydantic import PrivateAttr
+from harmony import HarmonyParser, parse_harmony_output, parse_tool_arguments
+import inspect
 import json
-import re
+import os
 import asyncio
+import threading
+import time
+import uuid
+import weakref
+
+
+class SpinEventLoop:
+    """
+    A long-lived asyncio loop running on a daemon thread.
+
+    Every Spin request from the wrappers in this module is executed on this loop,
+    so sync callers never create and tear down a loop per call (asyncio.run) and
+    connection state bound to the loop survives between requests. Works the same
+    from plain scripts, Streamlit threads and Jupyter, where a loop is already
+    running on the caller's thread.
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name="spin-event-loop", daemon=True
+                )
+                self._thread.start()
+            return self._loop
+
+    def _on_loop_thread(self) -> bool:
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def run(self, coro, timeout: Optional[float] = None) -> Any:
+        """Runs a coroutine on the shared loop and blocks until it finishes."""
+        if self._on_loop_thread():
+            coro.close()
+            raise RuntimeError("SpinEventLoop.run() called from the loop thread; await the coroutine instead")
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    async def arun(self, coro) -> Any:
+        """Awaits a coroutine on the shared loop from any other event loop."""
+        if self._on_loop_thread():
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self.loop))
+
+    def iterate(self, agen: AsyncIterator[Any]) -> Iterator[Any]:
+        """Drives an async generator on the shared loop from sync code."""
+        try:
+            while True:
+                try:
+                    yield self.run(agen.__anext__())
+                except StopAsyncIteration:
+                    break
+        finally:
+            self.run(agen.aclose())
+
+    async def aiterate(self, agen: AsyncIterator[Any]) -> AsyncIterator[Any]:
+        """Drives an async generator on the shared loop from another event loop."""
+        if self._on_loop_thread():
+            try:
+                async for item in agen:
+                    yield item
+            finally:
+                await agen.aclose()
+            return
+        try:
+            while True:
+                try:
+                    yield await self.arun(agen.__anext__())
+                except StopAsyncIteration:
+                    break
+        finally:
+            await self.arun(agen.aclose())
+
+    def close(self) -> None:
+        """Stops the loop thread. A later call starts a fresh one."""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(loop.stop)
+            if thread is not None:
+                thread.join()
+            loop.close()
+
+
+spin_loop = SpinEventLoop()
+
+
+class _PooledSession:
+    def __init__(self):
+        self.handle: Any = None
+        self.refs = 0
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+
+
+class SpinSessionPool:
+    """
+    Process-wide registry of warm Spin llm handles.
+
+    Handles are keyed by (pem path, model, scope, team), so every SpinChatModel
+    (and every bind_tools copy) asking for the same resource shares one handle
+    and pays the PEM load and host negotiation only once. Handles are reference
+    counted by the models using them. Unreferenced handles are dropped after
+    idle_timeout seconds, or least recently used first once the pool holds more
+    than max_handles.
+    """
+
+    def __init__(self, max_handles: int = 8, idle_timeout: float = 600.0):
+        self.max_handles = max_handles
+        self.idle_timeout = idle_timeout
+        self._spins: Dict[str, Any] = {}
+        self._sessions: "OrderedDict[Tuple, _PooledSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @staticmethod
+    def make_key(encryption_path: str, resource: Dict[str, Any]) -> Tuple:
+        return (
+            os.path.abspath(encryption_path),
+            resource.get("model"),
+            resource.get("scope"),
+            resource.get("team"),
+        )
+
+    def acquire(self, encryption_path: str, resource: Dict[str, Any]) -> Tuple[Tuple, Any]:
+        """
+        Returns (key, llm handle) for the resource, requesting it from Spin on first use.
+        Concurrent first requests for the same key wait for a single negotiation.
+        Every acquire must be matched by a release(key).
+        """
+        key = self.make_key(encryption_path, resource)
+        with self._lock:
+            self._evict_idle()
+            session = self._sessions.get(key)
+            if session is None:
+                session = self._sessions[key] = _PooledSession()
+            session.refs += 1
+            session.last_used = time.monotonic()
+            self._sessions.move_to_end(key)
+
+        try:
+            with session.lock:
+                if session.handle is None:
+                    handle = self._spin_for(key[0]).request(dict(resource))
+                    if handle is None:
+                        raise RuntimeError(f"Failed to connect to model {resource.get('model')!r}")
+                    session.handle = handle
+                    hit = False
+                else:
+                    hit = True
+        except BaseException:
+            self.release(key)
+            raise
+
+        with self._lock:
+            if hit:
+                self._hits += 1
+            else:
+                self._misses += 1
+            self._evict_over_capacity()
+        return key, session.handle
+
+    def release(self, key: Tuple) -> None:
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                return
+            session.refs = max(0, session.refs - 1)
+            session.last_used = time.monotonic()
+            if session.handle is None and session.refs == 0:
+                del self._sessions[key]
+            self._evict_over_capacity()
+
+    def touch(self, key: Tuple) -> None:
+        """Marks the session as recently used, e.g. once per request."""
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is not None:
+                session.last_used = time.monotonic()
+                self._sessions.move_to_end(key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "in_use": sum(1 for s in self._sessions.values() if s.refs > 0),
+                "refs": sum(s.refs for s in self._sessions.values()),
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "max_handles": self.max_handles,
+            }
+
+    def clear(self) -> None:
+        """Drops every idle handle and cached Spin instance."""
+        with self._lock:
+            for key in [k for k, s in self._sessions.items() if s.refs == 0]:
+                del self._sessions[key]
+                self._evictions += 1
+            if not self._sessions:
+                self._spins.clear()
+
+    def _spin_for(self, encryption_path: str) -> Any:
+        with self._lock:
+            spin = self._spins.get(encryption_path)
+            if spin is None:
+                spin = self._spins[encryption_path] = Spin(encryption_path)
+            return spin
+
+    # Callers hold self._lock
+    def _evict_idle(self) -> None:
+        deadline = time.monotonic() - self.idle_timeout
+        for key in [k for k, s in self._sessions.items() if s.refs == 0 and s.last_used < deadline]:
+            del self._sessions[key]
+            self._evictions += 1
+
+    def _evict_over_capacity(self) -> None:
+        while len(self._sessions) > self.max_handles:
+            idle = next((k for k, s in self._sessions.items() if s.refs == 0), None)
+            if idle is None:
+                break
+            del self._sessions[idle]
+            self._evictions += 1
+
+
+spin_pool = SpinSessionPool()
+
+
+class StreamLimiter:
+    """
+    Client side generation limits over a streamed response: stop sequences and a
+    character budget. feed() returns the part of each chunk that may be released.
+    Up to len(longest stop) - 1 characters are held back so a stop sequence split
+    across chunks is still caught. Once a limit is hit, done is set and the caller
+    should cancel the request.
+    """
+
+    def __init__(self, stop: Optional[List[str]] = None, max_chars: Optional[int] = None):
+        self.stop = [s for s in stop or [] if s]
+        self.max_chars = max_chars
+        self.emitted = 0
+        self.done = False
+        self.reason: Optional[str] = None  # "stop" or "length"
+        self._hold = max(map(len, self.stop), default=1) - 1
+        self._buffer = ""
+
+    def feed(self, chunk: str) -> str:
+        if self.done:
+            return ""
+        text = self._buffer + chunk
+        cut = min((i for i in (text.find(s) for s in self.stop) if i >= 0), default=-1)
+        if cut >= 0:
+            released, self._buffer = text[:cut], ""
+            self.done, self.reason = True, "stop"
+        elif self._hold:
+            split = max(0, len(text) - self._hold)
+            released, self._buffer = text[:split], text[split:]
+        else:
+            released, self._buffer = text, ""
+        return self._take(released)
+
+    def flush(self) -> str:
+        """Releases the held back tail at the end of the stream."""
+        released, self._buffer = self._buffer, ""
+        return "" if self.done else self._take(released)
+
+    def _take(self, released: str) -> str:
+        if self.max_chars is not None and self.emitted + len(released) >= self.max_chars:
+            released = released[:max(0, self.max_chars - self.emitted)]
+            self.done = True
+            self.reason = self.reason or "length"
+            self._buffer = ""
+        self.emitted += len(released)
+        return released
+
+
+class TranscriptRenderer:
+    """
+    Renders chat messages into the Spin prompt transcript.
+
+    Each message's rendered line is memoized by its type, name, content and tool
+    calls, so an agent loop that re-sends the same history after every tool result
+    only renders the new messages, and the prompt is assembled with a single join
+    instead of repeated string concatenation. last_stats reports how much of the
+    prompt is an unchanged prefix of the previous render. With a tool output
+    limiter, tool results are shaped once, when their line is first rendered.
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[Tuple, str]" = OrderedDict()
+        self._previous: List[Tuple] = []
+        self._lock = threading.Lock()
+        self.last_stats: Dict[str, int] = {}
+
+    @staticmethod
+    def _message_key(m: Any) -> Tuple:
+        content = getattr(m, "content", None)
+        if not isinstance(content, str):
+            content = repr(content) if content is not None else str(m)
+        tool_calls = getattr(m, "tool_calls", None) or ()
+        return (
+            type(m),
+            getattr(m, "name", None),
+            content,
+            tuple((tc["name"], repr(tc["args"])) for tc in tool_calls),
+        )
+
+    @staticmethod
+    def render_message(m: Any, tool_output_limiter: Any = None) -> str:
+        if isinstance(m, SystemMessage):
+            return f"[SYSTEM] {m.content}\n"
+        if isinstance(m, HumanMessage):
+            return f"[USER] {m.content}\n"
+        if isinstance(m, ToolMessage):
+            content = m.content
+            if tool_output_limiter is not None and isinstance(content, str):
+                content = tool_output_limiter.shape(m.name, content)
+            return f"[TOOL OUTPUT for {m.name}] {content}\n"
+        if isinstance(m, AIMessage):
+            # AIMessage can have either normal text or tool calls
+            if hasattr(m, "tool_calls") and m.tool_calls:
+                return "".join(f"[ASSISTANT CALL] {tc['name']} with {tc['args']}\n" for tc in m.tool_calls)
+            return f"[ASSISTANT] {m.content}\n"
+        return f"[OTHER] {getattr(m, 'content', str(m))}\n"
+
+    def render(self, messages: List[Any], tool_output_limiter: Any = None) -> str:
+        keys = [self._message_key(m) + (id(tool_output_limiter),) for m in messages]
+        parts = []
+        with self._lock:
+            for key, m in zip(keys, messages):
+                part = self._cache.get(key)
+                if part is None:
+                    part = self._cache[key] = self.render_message(m, tool_output_limiter)
+                    if len(self._cache) > self.max_entries:
+                        self._cache.popitem(last=False)
+                else:
+                    self._cache.move_to_end(key)
+                parts.append(part)
+
+            prefix_messages = 0
+            for old, new in zip(self._previous, keys):
+                if old != new:
+                    break
+                prefix_messages += 1
+            self._previous = keys
+            self.last_stats = {
+                "messages": len(messages),
+                "chars": sum(map(len, parts)),
+                "prefix_messages": prefix_messages,
+                "prefix_chars": sum(map(len, parts[:prefix_messages])),
+            }
+        return "".join(parts)
+
 
 class SpinChatModel(BaseChatModel):
     """
@@ -18,17 +390,50 @@ class SpinChatModel(BaseChatModel):
     temperature: float = 0.7
     max_tokens: int = 2048
     encryption_path: str = ""
+    scope: Optional[str] = None  # e.g. "public" or "team"
+    team: Optional[str] = None  # only sent when scope == "team"
     kwargs: Dict[str, Any] = {}
     llm: Any = None
     spin: Any = None
 
     tools: Optional[List[Any]] = None  # Tool objects or dicts
     tool_choice: Any = None
+    stop_on_tool_call: bool = True  # cancel generation once a complete tool call was emitted
+    parallel_tool_calls: bool = True  # allow several tool calls in one response
+    chars_per_token: float = 4.0  # heuristic for the client side max_tokens budget
+    send_generation_params: bool = True  # forward temperature/max_tokens/stop to the host
+    response_cache: Any = None  # optional ResponseCache shared by models
+    tool_output_limiter: Any = None  # optional ToolOutputLimiter for tool results
+
+    _session_key: Any = PrivateAttr(default=None)
+    _transcript: TranscriptRenderer = PrivateAttr(default_factory=TranscriptRenderer)
+    _tool_preamble: Optional[Tuple[Tuple, str]] = PrivateAttr(default=None)
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.spin = Spin(self.encryption_path)
-        self.llm = self.spin.request({"model": self.model_name})
+        self._acquire_session()
+
+    def _resource(self) -> Dict[str, Any]:
+        resource = {"model": self.model_name}
+        if self.scope:
+            resource["scope"] = self.scope
+            if self.scope == "team" and self.team:
+                resource["team"] = self.team
+        return resource
+
+    def _acquire_session(self) -> None:
+        """
+        Takes a reference on the pooled llm handle for this model's resource.
+        The reference is released when this instance is garbage collected.
+        """
+        key, self.llm = spin_pool.acquire(self.encryption_path, self._resource())
+        self._session_key = key
+        self.spin = spin_pool._spin_for(key[0])
+        weakref.finalize(self, spin_pool.release, key)
+
+    @staticmethod
+    def pool_stats() -> Dict[str, Any]:
+        return spin_pool.stats()
 
     # -----------------------------
     # LangChain ChatModel interface
@@ -40,8 +445,8 @@ class SpinChatModel(BaseChatModel):
         Converts messages to a prompt, runs Spin, and returns a ChatResult with AIMessage.
         """
         prompt = self._convert_messages_to_prompt(messages)
-        response_text = await self._call_spin(prompt)
-        msg= self.parse_tool_call (response_text)
+        response_text, parser = await spin_loop.arun(self._respond(prompt, stop=stop, **kwargs))
+        msg = self._message_from_parser(parser, response_text)
         # Detect LangChain-style tool call
         # action_match = re.search(r"Action:\s*(\w+)", response_text)
         # input_match = re.search(r"Action Input:\s*(\{.*\})", response_text, re.DOTALL)
@@ -63,44 +468,71 @@ class SpinChatModel(BaseChatModel):
         #     msg = AIMessage(content=response_text)
         return ChatResult(generations=[ChatGeneration(message=msg)])
 
+    async def _astream(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        """
+        Streams the Spin response as AIMessageChunks while the host produces it.
+        If the full response turns out to be a tool call, the last chunk also carries
+        the tool call so the aggregated message has tool_calls set.
 
-    def parse_tool_call(self, response_text):
-
-        # NEW FORMAT
-        new_pattern = re.search(
-            r"<\|channel\|>commentary\s+to=(\w+).*?<\|message\|>(\{.*?\})",
-            response_text,
-            re.DOTALL
-        )
-
-        if new_pattern:
-            tool_name = new_pattern.group(1)
-            tool_args_str = new_pattern.group(2)
+        Each chunk is yielded once the next one arrives, so the last one can be
+        marked with chunk_position="last"; otherwise LangChain appends an extra
+        empty chunk, which agent streams show as one more message event.
+        """
+        prompt = self._convert_messages_to_prompt(messages)
+        parts = []
+        parser = HarmonyParser()
+        async for text in self._iter_response(prompt, parser, stop=stop, **kwargs):
+            if parts:
+                yield ChatGenerationChunk(message=AIMessageChunk(content=parts[-1]))
+            parts.append(text)
+
+        msg = self._message_from_parser(parser, "".join(parts))
+        if parts or msg.tool_calls:
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content=parts[-1] if parts else "",
+                tool_call_chunks=[
+                    tool_call_chunk(name=tc["name"], args=json.dumps(tc["args"]), id=tc["id"], index=i)
+                    for i, tc in enumerate(msg.tool_calls)
+                ],
+                chunk_position="last",
+            ))
+
+    def _stream(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs
+    ) -> Iterator[ChatGenerationChunk]:
+        """
+        Sync counterpart of _astream, driving the async stream on the shared Spin loop.
+        """
+        yield from spin_loop.iterate(self._astream(messages, stop=stop, **kwargs))
 
-        else:
-            # OLD FORMAT
-            action_match = re.search(r"Action:\s*(\w+)", response_text)
-            input_match = re.search(r"Action Input:\s*(\{.*\})", response_text, re.DOTALL)
 
-            if not action_match or not input_match:
-                return AIMessage(content=response_text)
+    def parse_tool_call(self, response_text):
+        """
+        Returns an AIMessage with a tool call if the response requests one, in either
+        the <|channel|> format or the Action:/Action Input: format, and a plain
+        AIMessage with the response text otherwise. The text is parsed in one pass.
+        """
+        return self._message_from_parser(parse_harmony_output(response_text), response_text)
 
-            tool_name = action_match.group(1)
-            tool_args_str = input_match.group(1)
+    def _message_from_parser(self, parser: HarmonyParser, response_text: str) -> AIMessage:
+        if not parser.tool_calls:
+            return AIMessage(content=response_text)
 
-        try:
-            tool_args = json.loads(tool_args_str)
-            print("Tool args:", tool_args)
-        except json.JSONDecodeError:
-            tool_args = {"input": tool_args_str}
-
-        tool_call = ToolCall(
-            id=f"call_{tool_name}_{hash(response_text) % 10000}",
-            name=tool_name,
-            args=tool_args,
-        )
+        calls = parser.tool_calls if self.parallel_tool_calls else parser.tool_calls[:1]
+        tool_calls = []
+        for tool_name, tool_args_str in calls:
+            tool_args = parse_tool_arguments(tool_args_str)
+            tool_calls.append(ToolCall(
+                # Unique per call, so several calls to the same tool in one response
+                # (or identical responses) never share an id
+                id=f"call_{uuid.uuid4().hex}",
+                name=tool_name,
+                args=tool_args,
+            ))
 
-        return AIMessage(content="", tool_calls=[tool_call])
+        return AIMessage(content="", tool_calls=tool_calls)
 
 
     def _generate(
@@ -110,8 +542,8 @@ class SpinChatModel(BaseChatModel):
         Converts messages to a prompt, runs Spin, and returns a ChatResult with AIMessage.
         """
         prompt = self._convert_messages_to_prompt(messages)
-        response_text = asyncio.run(self._call_spin(prompt))
-        msg= self.parse_tool_call (response_text)
+        response_text, parser = spin_loop.run(self._respond(prompt, stop=stop, **kwargs))
+        msg = self._message_from_parser(parser, response_text)
         # Detect LangChain-style tool call
         # action_match = re.search(r"Action:\s*(\w+)", response_text)
         # input_match = re.search(r"Action Input:\s*(\{.*\})", response_text, re.DOTALL)
@@ -132,38 +564,187 @@ class SpinChatModel(BaseChatModel):
         # else:
         #     msg = AIMessage(content=response_text)
         return ChatResult(generations=[ChatGeneration(message=msg)])
-    async def _call_spin(self, prompt: str) -> str:
+    async def _call_spin(self, prompt: str, stop: Optional[List[str]] = None, **kwargs) -> str:
         """
         Sends the prompt to Spin backend and returns the response.
         Augments prompt with tools if any are bound.
         """
-        payload = {"prompt":"","query": prompt}
+        response_text, _ = await self._respond(prompt, stop=stop, **kwargs)
+        return response_text
+
+    async def _respond(
+        self, prompt: str, stop: Optional[List[str]] = None, **kwargs
+    ) -> Tuple[str, HarmonyParser]:
+        """Runs the prompt to completion (or to an early stop) and returns the text and its parse."""
+        parser = HarmonyParser()
+        parts = [text async for text in self._iter_response(prompt, parser, stop=stop, **kwargs)]
+        return "".join(parts), parser
+
+    async def _iter_response(
+        self, prompt: str, parser: HarmonyParser, stop: Optional[List[str]] = None, **kwargs
+    ) -> AsyncIterator[str]:
+        """
+        Yields response chunks, feeding each one into parser. The request is cancelled
+        as soon as a stop sequence or the max_tokens budget is reached, and, with
+        stop_on_tool_call set, once a complete tool call (balanced JSON arguments)
+        has been parsed, since everything generated after it would be discarded.
+        With a response_cache set, cacheable requests are answered from it when possible.
+        """
+        params = self._generation_params(stop, **kwargs)
+        cache_key = self._cache_key(prompt, params)
+        if cache_key is not None:
+            # SQLite reads block, keep them off the event loop
+            cached = await asyncio.to_thread(self.response_cache.get, cache_key)
+            if cached is not None:
+                parser.feed(cached)
+                parser.close()
+                yield cached
+                return
+
+        limiter = StreamLimiter(params.get("stop"), int(params["max_tokens"] * self.chars_per_token))
+        stream = spin_loop.aiterate(self._stream_spin(self._build_payload(prompt, params)))
+        parts = []
+        try:
+            async for text in stream:
+                released = limiter.feed(text)
+                if released:
+                    parts.append(released)
+                    parser.feed(released)
+                    yield released
+                if limiter.done or (self.stop_on_tool_call and self._tool_calls_complete(parser)):
+                    break
+            else:
+                released = limiter.flush()
+                if released:
+                    parts.append(released)
+                    parser.feed(released)
+                    yield released
+            # Only reached when the response was read to its end (or to a limit)
+            if cache_key is not None:
+                await asyncio.to_thread(self.response_cache.put, cache_key, "".join(parts))
+        finally:
+            await stream.aclose()
+            parser.close()
+
+    def _cache_key(self, prompt: str, params: Dict[str, Any]) -> Optional[str]:
+        if self.response_cache is None or not self.response_cache.should_cache(params):
+            return None
+        return self.response_cache.make_key(self.model_name, prompt, self.tool_preamble, params)
+
+    def _tool_calls_complete(self, parser: HarmonyParser) -> bool:
+        """
+        Whether generation can stop early because the tool calls are complete.
+        Without parallel tool calls that is as soon as the first call's JSON closes.
+        With parallel_tool_calls (the default) another call may follow, so the stop
+        is delayed to the first non-blank output after the JSON that does not start
+        another "Action:" (see HarmonyParser.tool_calls_settled). A response that
+        ends right after a single call simply ends; nothing is left to cancel.
+        """
+        if self.parallel_tool_calls:
+            return parser.tool_calls_settled
+        return parser.has_tool_call
+
+    def _generation_params(self, stop: Optional[List[str]] = None, **kwargs) -> Dict[str, Any]:
+        """Generation limits for one request; per call kwargs override the model fields."""
+        params = {
+            "temperature": kwargs.get("temperature", self.temperature),
+            "max_tokens": kwargs.get("max_tokens", self.max_tokens),
+        }
+        if stop:
+            params["stop"] = list(stop)
+        return params
 
+    def _build_payload(self, prompt: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Builds the Spin request payload, prefixing the tool instructions if any are bound
+        and adding the generation limits unless send_generation_params is off.
+        """
+        payload = {"prompt": "", "query": prompt}
         if self.tools:
-            tool_text = self._format_tools(self.tools)
-            payload["query"] = tool_text + "\n\n" + prompt
-        # print('Payload: ',payload)
-        return await self.llm.run(payload)
+            payload["query"] = self.tool_preamble + "\n\n" + prompt
+        if params and self.send_generation_params:
+            payload.update(params)
+        return payload
+
+    @property
+    def tool_preamble(self) -> str:
+        """
+        The tool instruction block prepended to every query, built once per bound
+        tool set. The cache is keyed on the identity of the tool objects, so it is
+        rebuilt when tools are rebound or the list is changed.
+        """
+        if not self.tools:
+            return ""
+        signature = (self.parallel_tool_calls,) + tuple(map(id, self.tools))
+        cached = self._tool_preamble
+        if cached is None or cached[0] != signature:
+            cached = self._tool_preamble = (signature, self._format_tools(self.tools))
+        return cached[1]
+
+    def tool_preamble_size(self) -> int:
+        """Length in characters of the cached tool preamble."""
+        return len(self.tool_preamble)
+
+    def _supports_chunks(self) -> bool:
+        """True if the Spin llm handle accepts an on_chunk callback in run()."""
+        try:
+            params = inspect.signature(self.llm.run).parameters
+        except (TypeError, ValueError):
+            return False
+        return "on_chunk" in params or any(p.kind is p.VAR_KEYWORD for p in params.values())
+
+    async def _stream_spin(self, payload: Dict[str, Any]) -> AsyncIterator[str]:
+        """
+        Yields response text chunks as the Spin backend delivers them, the same way
+        the Node SDK's session.run(..., {onChunk}) does. Falls back to a single chunk
+        holding the whole response when the installed SDK cannot stream.
+        Closing the generator early cancels the pending request.
+        """
+        spin_pool.touch(self._session_key)
+        if not self._supports_chunks():
+            yield await self.llm.run(payload)
+            return
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        # The SDK may call on_chunk from its own thread, so hop back onto our loop.
+        on_chunk = lambda chunk: loop.call_soon_threadsafe(queue.put_nowait, chunk)
+        task = asyncio.ensure_future(self.llm.run(payload, on_chunk=on_chunk))
+        streamed = False
+        try:
+            while True:
+                getter = asyncio.ensure_future(queue.get())
+                done, _ = await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+                if getter not in done:
+                    getter.cancel()
+                    break
+                if getter.result():
+                    streamed = True
+                    yield getter.result()
+            # Let callbacks scheduled right before completion land, then drain them.
+            await asyncio.sleep(0)
+            while not queue.empty():
+                chunk = queue.get_nowait()
+                if chunk:
+                    streamed = True
+                    yield chunk
+            result = task.result()
+            if not streamed and result:
+                yield result
+        finally:
+            if not task.done():
+                task.cancel()
 
     def _convert_messages_to_prompt(self, messages: list) -> str:
-        text = ""
-        for m in messages:
-            if isinstance(m, SystemMessage):
-                text += f"[SYSTEM] {m.content}\n"
-            elif isinstance(m, HumanMessage):
-                text += f"[USER] {m.content}\n"
-            elif isinstance(m, ToolMessage):
-                text += f"[TOOL OUTPUT for {m.name}] {m.content}\n"
-            elif isinstance(m, AIMessage):
-                # AIMessage can have either normal text or tool calls
-                if hasattr(m, "tool_calls") and m.tool_calls:
-                    for tc in m.tool_calls:
-                        text += f"[ASSISTANT CALL] {tc['name']} with {tc['args']}\n"
-                else:
-                    text += f"[ASSISTANT] {m.content}\n"
-            else:
-                text += f"[OTHER] {getattr(m, 'content', str(m))}\n"
-        return text
+        return self._transcript.render(messages, self.tool_output_limiter)
+
+    def transcript_stats(self) -> Dict[str, int]:
+        """Size of the last rendered prompt and how much of it was unchanged from the call before."""
+        return dict(self._transcript.last_stats)
+
+    def tool_output_stats(self) -> Dict[str, Any]:
+        """Bytes of tool output received and actually sent, per tool."""
+        return self.tool_output_limiter.stats() if self.tool_output_limiter is not None else {}
 
     def _format_tools(self, tools: List[Any]) -> str:
         formatted = ["You have access to the following tools:"]
@@ -182,6 +763,11 @@ class SpinChatModel(BaseChatModel):
             "Action Input: <JSON string of the input>\n"
             "Do not write anything else. If you already know the answer from previous tool outputs or conversation history, dont call any tools and just respond with the answer."
         )
+        if self.parallel_tool_calls:
+            formatted.append(
+                "If you need several independent tool results (for example the same lookup for different inputs), "
+                "write one Action/Action Input pair per call, one after another, in the same response."
+            )
         return "\n".join(formatted)
 
     # -----------------------------
@@ -198,6 +784,11 @@ class SpinChatModel(BaseChatModel):
         # Apply any additional LLM overrides
         for k, v in kwargs.items():
             setattr(new, k, v)
+        # Build the tool preamble now instead of on the first request
+        new._tool_preamble = None
+        new.tool_preamble
+        # The copy shares the pooled handle, so it needs its own reference
+        new._acquire_session()
         return new
 
     # -----------------------------
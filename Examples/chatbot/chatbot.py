@@ -1,14 +1,16 @@
 import streamlit as st
-from typing import Any
 import requests
-import re
 import time
 from pydantic import BaseModel, Field
 from langchain_community.tools import Tool
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from langchain_core.messages import HumanMessage, AIMessageChunk, ToolMessage
 from langchain.agents import create_agent
 from SpinLLM import SpinChatModel
-from ddgs import DDGS
+from harmony import HarmonyParser
+from history import HistoryManager, llm_summarizer
+from tool_output import ToolOutputLimiter, ToolOutputPolicy
+from search import DDGSProvider, SearchService
+from tool_executor import ToolExecutor, ToolLimits
 
 #Initialize SpiLLI
 @st.cache_resource
@@ -18,66 +20,29 @@ def load_resources():
         model_name ="Llama-3-Groq-8B-Tool-Use",
         encryption_path='./SpiLLI_Community.pem',
         temperature=0.8,
-        max_tokens=512
+        max_tokens=512,
+        # Keep search results from crowding out the conversation
+        tool_output_limiter=ToolOutputLimiter(
+            policies={"internet_search": ToolOutputPolicy(max_chars=1500, strategy="head")},
+        ),
     )
 
     return llm
 
-def internet_search_fn(query: str) -> str:
-    """Searches the internet using DuckDuckGo Instant Answer API
-    Reliable internet search using DuckDuckGo Search.
-    Returns top results with title and snippet.
-    """
-    try:
-        with DDGS() as ddgs:
-            results = list(ddgs.text(query,max_results =5))
-        
-        if not results:
-            return "No results found."
-        
-        formatted = []
-        for r in results:
-            title = r.get("title", "")
-            body = r.get("body", "")
-            link = r.get("href", "")
-            formatted.append(f"{title}\n{body}\nSource: {link}")
-        
-        return "\n\n".join(formatted)
-        
-    except Exception as e:
-        return f"Internet search failed : {str(e)}"
+# Cached, deduplicated DuckDuckGo search with a per-call deadline
+search_service = SearchService(DDGSProvider(), max_results=5, deadline=8.0)
+
+# Sync tools run on bounded worker pools, never on the thread driving the agent
+tool_executor = ToolExecutor(
+    max_workers=8,
+    default=ToolLimits(timeout=10.0),
+    limits={"internet_search": ToolLimits(timeout=10.0, max_concurrency=4)},
+)
     
 class InternetSearchInput(BaseModel):
     query: str = Field(..., description="Search query for internet lookup")
 
 
-def clean_agent_output(text: str) -> str:
-    """
-    Removes model channel tokens and end markers from agent output.
-    """
-    if not text:
-        return text
-
-    # Case 1: OSS token format
-    match = re.search(r"<\|channel\|>final<\|message\|>(.*)", text, re.DOTALL)
-    if match:
-        text = match.group(1)
-    else:
-        # Case 2: Plain text channel format
-        match = re.search(r"\bfinal\b(.*)", text, re.DOTALL | re.IGNORECASE)
-        if match:
-            text = match.group(1)
-            
-    # Remove <|...|> blocks
-    text = re.sub(r"<\|.*?\|>", "", text)
-
-    # Remove [EOG] or similar markers
-    text = re.sub(r"\[EOG\]", "", text, flags=re.IGNORECASE)
-
-    return text.strip()
-
-
-
 # ----------------------------------
 # (Optional) utility tool example
 # ----------------------------------
@@ -86,15 +51,36 @@ def echo_tool_fn(text: str) -> str:
     return f"You said: {text}"
       
 
-def stream_text(text: str, delay: float = 0.015):
+def stream_agent_reply(agent, inputs, render_interval: float = 0.05) -> str:
+    """
+    Streams the agent's answer into the chat as the model produces it.
+    Chunks come straight from SpinChatModel._stream, so the first token shows up
+    after the real network latency, and each chunk is parsed once as it arrives.
+    Re-rendering is throttled to render_interval seconds to keep markdown work
+    bounded on long replies.
+    """
     placeholder = st.empty()
-    output = ""
-
-    for char in text:
-        output += char
-        placeholder.markdown(output)
-        time.sleep(delay)
-
+    parser = HarmonyParser()
+    last_render = 0.0
+
+    for chunk, _ in agent.stream(inputs, stream_mode="messages"):
+        if isinstance(chunk, ToolMessage) or getattr(chunk, "tool_call_chunks", None):
+            # That model step was a tool call; the answer starts with the next step
+            parser = HarmonyParser()
+            placeholder.empty()
+            continue
+        if not isinstance(chunk, AIMessageChunk) or not isinstance(chunk.content, str) or not chunk.content:
+            continue
+
+        parser.feed(chunk.content)
+        now = time.monotonic()
+        if now - last_render >= render_interval:
+            placeholder.markdown(parser.final_text())
+            last_render = now
+
+    parser.close()
+    output = parser.final_text() or "No response from agent."
+    placeholder.markdown(output)
     return output
 
 
@@ -111,11 +97,12 @@ def create_chatbot_agent(llm):
 
     internet_search_tool = Tool.from_function(
         name="internet_search",
-        func=internet_search_fn,
+        func=search_service.search,
+        coroutine=search_service.asearch,
         description="Search the internet for real-time information. Input should be a single search query string.",
     )
 
-    tools = [echo_tool, internet_search_tool]
+    tools = [tool_executor.wrap(t) for t in (echo_tool, internet_search_tool)]
     
     agent = create_agent(
         model=llm,
@@ -124,18 +111,24 @@ def create_chatbot_agent(llm):
 
     return agent
 
+SYSTEM_PROMPT = """
+    You are a friendly, helpful AI chatbot.
+    Do NOT hallucinate real-world facts.
+"""
+
 def build_history(messages):
-        system_prompt = """
-            You are a friendly, helpful AI chatbot.
-            Do NOT hallucinate real-world facts.
-        """
-        history = [SystemMessage(content= system_prompt)]
-        for msg in messages:
-            if msg["role"] == "user":
-                history.append(HumanMessage(content=msg["content"]))
-            else:
-                history.append(AIMessage(content=msg["content"]))
-        return history
+    """
+    System prompt plus the most recent turns that fit the token budget; older
+    turns are carried in a rolling summary, refreshed every few turns.
+    """
+    if "history_manager" not in st.session_state:
+        st.session_state.history_manager = HistoryManager(
+            SYSTEM_PROMPT,
+            max_tokens=3072,
+            summarize_every=4,
+            summarizer=llm_summarizer(load_resources()),
+        )
+    return st.session_state.history_manager.build(messages)
 
 # ----------------------------------
 # Streamlit UI
@@ -178,29 +171,6 @@ for msg in st.session_state.chat_history:
 # User input
 user_input = st.chat_input("Type your message...")
 
-# ----------------------------------
-# Robust agent output parser
-# ----------------------------------
-def _parse_agent_result(res: Any) -> str:
-    if res is None:
-        return "No response from agent."
-    if isinstance(res, str):
-        return res
-    if isinstance(res, dict):
-        if "output" in res:
-            return res["output"]
-        if "result" in res:
-            return res["result"]
-        if "final_output" in res:
-            return res["final_output"]
-        if "messages" in res and res["messages"]:
-           last = res["messages"][-1]
-           if hasattr(last, "content"):
-            return last.content
-        return str(last)
-    return str(res)
-
-
 # ----------------------------------
 # Handle user interaction
 # ----------------------------------
@@ -215,21 +185,16 @@ if user_input:
     # Build memory
     history = build_history(st.session_state.chat_history[:-1])
 
-    with st.spinner("Thinking..."):
+    # Stream output
+    with st.chat_message("assistant"):
         try:
-            result = st.session_state.agent.invoke(
-                {"messages": history + [user_input]}
+            final_text = stream_agent_reply(
+                st.session_state.agent,
+                {"messages": history + [HumanMessage(content=user_input)]},
             )
-            print("Result:", result)
-            raw_output = _parse_agent_result(result)
-            print("Raw output:", raw_output)
-            cleaned = clean_agent_output(raw_output)
         except Exception as e:
-            cleaned = f"Error: {str(e)}"
-
-    # Stream output
-    with st.chat_message("assistant"):
-        final_text = stream_text(cleaned)
+            final_text = f"Error: {str(e)}"
+            st.markdown(final_text)
         print("Final text:", final_text)
 
     # Show assistant response
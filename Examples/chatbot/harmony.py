@@ -0,0 +1,409 @@
+"""
+Single-pass, incremental parser for model output, the Python counterpart of the
+Node SDK's parseHarmonyOutput.
+
+It understands two formats:
+
+* Harmony channel format, as produced by the gpt-oss models:
+  <|start|>assistant<|channel|>commentary to=functions.get_weather <|constrain|>json<|message|>{"city": "Paris"}<|call|>
+* The legacy ReAct style format used in the tool instructions of SpinChatModel:
+  Action: get_weather
+  Action Input: {"city": "Paris"}
+
+Text can be fed in chunks as it streams in. Every character is scanned once, and
+the parser emits typed segments (channel, recipient, message, terminator) as
+soon as they are complete.
+"""
+import json
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+# One alternation for every marker we care about, so the text is scanned once
+_MARKERS = re.compile(r"<\|(\w+)\|>|(?i:\[EOG\])|\bAction Input:|\bAction:")
+_RECIPIENT = re.compile(r"\bto=([\w.\-]+)")
+_ACTION_NAME = re.compile(r"\s*([\w.\-]+)")
+
+_TERMINATORS = {"end", "call", "return"}
+_LEGACY_MARKERS = ("Action Input:", "Action:", "[EOG]")
+_MAX_HOLDBACK = 64  # longest partial marker kept back at the end of a chunk
+
+
+class HarmonySegment(NamedTuple):
+    kind: str  # "channel" | "recipient" | "message" | "terminator"
+    text: str
+    channel: Optional[str] = None
+    recipient: Optional[str] = None
+
+
+def _strip_namespace(recipient: str) -> str:
+    # Harmony addresses tools as "functions.<name>"
+    return recipient.split(".", 1)[1] if recipient.startswith("functions.") else recipient
+
+
+class HarmonyParser:
+    """
+    Incremental parser. Call feed() with each chunk and close() at the end; both
+    return the segments completed by that call. Parsed state is available at
+    any time through messages, tool_calls and final_text().
+    """
+
+    def __init__(self):
+        self.messages: List[Dict[str, Any]] = []
+        self.tool_calls: List[Tuple[str, str]] = []  # (name, raw arguments), in order
+        self.saw_tokens = False
+        self._moved_on = False  # non tool call output seen after the last tool call
+
+        self._pending = ""
+        self._mode = "text"  # "text" | "header" | "action_name" | "action_input"
+        self._header: List[str] = []
+        self._in_constrain = False
+        self._role_recipient: Optional[str] = None
+        self._message: Optional[Dict[str, Any]] = None
+        self._action: Optional[str] = None
+        # Balanced JSON scanner state for "Action Input:"
+        self._json: List[str] = []
+        self._json_lead = ""
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    # -----------------------------
+    # Public API
+    # -----------------------------
+    def feed(self, chunk: str) -> List[HarmonySegment]:
+        if not chunk:
+            return []
+        out: List[HarmonySegment] = []
+        self._consume(self._pending + chunk, out, final=False)
+        return out
+
+    def close(self) -> List[HarmonySegment]:
+        out: List[HarmonySegment] = []
+        text, self._pending = self._pending, ""
+        if text:
+            self._consume(text, out, final=True)
+        if self._mode == "action_name":
+            self._mode = "text"
+        elif self._mode == "action_input":
+            # Output ended before the JSON was balanced: not a tool call
+            self._abandon_action_input(out)
+        elif self._mode == "header":
+            self._header.clear()
+            self._mode = "text"
+        self._end_message(out, terminator="")
+        return out
+
+    def final_text(self) -> str:
+        """
+        The user facing answer: the final channel if the model used one, otherwise
+        every non-analysis message, otherwise all message text.
+        """
+        final = [m for m in self.messages if m["channel"] == "final"]
+        if not final:
+            final = [m for m in self.messages if m["channel"] != "analysis" and not m["recipient"]]
+        if not final:
+            final = [m for m in self.messages if not m["recipient"]]
+        text = "".join("".join(m["parts"]) for m in final)
+        if not self.saw_tokens:
+            text = _plain_channel_answer(text)
+        return text.strip()
+
+    # -----------------------------
+    # Scanner
+    # -----------------------------
+    def _consume(self, text: str, out: List[HarmonySegment], final: bool) -> None:
+        self._pending = ""
+        pos = 0
+        n = len(text)
+        while pos < n:
+            if self._mode == "action_input":
+                pos = self._scan_json(text, pos, out)
+                continue
+            if self._mode == "action_name":
+                if not final and text[pos:].isspace():
+                    self._pending = text[pos:]
+                    return
+                match = _ACTION_NAME.match(text, pos)
+                if match is None:
+                    # "Action:" without a tool name, keep it as plain text
+                    self._mode = "text"
+                    continue
+                if match.end() == n and not final:
+                    self._pending = text[pos:]
+                    return
+                self._add_text(match.group(0), out, marker=True)
+                self._action = match.group(1)
+                self._emit_recipient(out, self._action)
+                self._mode = "text"
+                pos = match.end()
+                continue
+
+            match = _MARKERS.search(text, pos)
+            end = match.start() if match else n
+            if not final and match is None:
+                end = self._holdback_start(text, pos, n)
+            if end > pos:
+                self._add_text(text[pos:end], out)
+            if match is None:
+                self._pending = text[end:]
+                return
+            pos = match.end()
+            self._on_marker(match, text, out)
+
+    def _holdback_start(self, text: str, pos: int, n: int) -> int:
+        """Where a possibly incomplete marker starts at the end of the chunk."""
+        start = max(pos, n - _MAX_HOLDBACK)
+        token = text.rfind("<", start, n)
+        if token >= 0 and "|>" not in text[token:] and (token == n - 1 or text[token + 1] == "|"):
+            return token
+        tail = text[max(pos, n - 13):]
+        for i in range(len(tail)):
+            suffix = tail[i:]
+            if any(marker.startswith(suffix) or marker.startswith(suffix.upper()) for marker in _LEGACY_MARKERS):
+                return n - len(suffix)
+        return n
+
+    def _on_marker(self, match: "re.Match", text: str, out: List[HarmonySegment]) -> None:
+        token = match.group(1)
+        if token is None:
+            marker = match.group(0).lower()
+            if marker == "[eog]":
+                self._end_message(out, terminator=match.group(0))
+            elif marker == "action:":
+                # Legacy markers stay in the message text, so output that turns out
+                # not to be a tool call reads exactly as the model wrote it
+                self._add_text(match.group(0), out, marker=True)
+                self._mode = "action_name"
+                self._action = None
+            elif self._action is not None:  # "Action Input:" after a tool name
+                self._add_text(match.group(0), out, marker=True)
+                self._end_message(out, terminator="")
+                self._start_action_input(self._action)
+            else:
+                self._add_text(match.group(0), out)
+            return
+
+        self.saw_tokens = True
+        token = token.lower()
+        if self._mode == "header":
+            if token == "message":
+                self._open_message(out)
+                return
+            if token == "constrain":
+                self._in_constrain = True
+                return
+            if token == "channel":
+                # Drop the role, but keep a recipient given there ("assistant to=functions.x")
+                self._take_role_recipient()
+                return
+        if token in ("start", "channel"):
+            self._end_message(out, terminator="")
+            self._mode = "header"
+            self._header.clear()
+            self._in_constrain = False
+            self._role_recipient = None
+        elif token in _TERMINATORS:
+            self._end_message(out, terminator=match.group(0))
+        elif token == "message":
+            self._open_message(out)
+        # Anything else (<|constrain|>, unknown tokens) is dropped from the text
+
+    def _scan_json(self, text: str, pos: int, out: List[HarmonySegment]) -> int:
+        n = len(text)
+        if self._depth == 0 and not self._json:
+            start = pos
+            while pos < n and text[pos].isspace():
+                pos += 1
+            self._json_lead += text[start:pos]
+            if pos == n:
+                return n
+            if text[pos] != "{":
+                # Not a JSON object (the old regex required one too): back to plain text
+                self._abandon_action_input(out)
+                return pos
+        start = pos
+        while pos < n:
+            ch = text[pos]
+            pos += 1
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "<":
+                # A control token inside the arguments: this is not valid JSON
+                self._json.append(text[start:pos - 1])
+                self._abandon_action_input(out)
+                return pos - 1
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._json.append(text[start:pos])
+                    self._finish_action(out, "".join(self._json), terminator="}")
+                    return pos
+        self._json.append(text[start:pos])
+        return pos
+
+    # -----------------------------
+    # Segment bookkeeping
+    # -----------------------------
+    def _add_text(self, text: str, out: List[HarmonySegment], marker: bool = False) -> None:
+        if self._mode == "header":
+            if not self._in_constrain:
+                self._header.append(text)
+            return
+        if self.tool_calls and not marker and not self._moved_on and not text.isspace():
+            self._moved_on = True
+        if self._message is None:
+            self._message = {"channel": None, "recipient": None, "parts": []}
+            self.messages.append(self._message)
+        self._message["parts"].append(text)
+        out.append(HarmonySegment("message", text, self._message["channel"], self._message["recipient"]))
+
+    def _take_role_recipient(self) -> None:
+        match = _RECIPIENT.search("".join(self._header))
+        if match:
+            self._role_recipient = match.group(1)
+        self._header.clear()
+        self._in_constrain = False
+
+    def _open_message(self, out: List[HarmonySegment]) -> None:
+        header = "".join(self._header).strip()
+        self._header.clear()
+        self._in_constrain = False
+        self._mode = "text"
+        match = _RECIPIENT.search(header)
+        recipient = match.group(1) if match else self._role_recipient
+        recipient = _strip_namespace(recipient) if recipient else None
+        self._role_recipient = None
+        channel = header.split(None, 1)[0] if header else None
+        if channel and (channel.startswith("to=") or channel.lower() == "assistant"):
+            # <|start|>assistant<|message|> without a channel
+            channel = None
+        self._message = {"channel": channel, "recipient": recipient, "parts": []}
+        self.messages.append(self._message)
+        out.append(HarmonySegment("channel", channel or "", channel, recipient))
+        if recipient:
+            out.append(HarmonySegment("recipient", recipient, channel, recipient))
+            # Tool arguments: complete as soon as the JSON object is balanced,
+            # without waiting for <|call|>
+            self._start_action_input(recipient)
+
+    def _start_action_input(self, name: str) -> None:
+        self._moved_on = False
+        self._mode = "action_input"
+        self._action = name
+        self._json.clear()
+        self._json_lead = ""
+        self._depth = 0
+        self._in_string = self._escape = False
+
+    def _emit_recipient(self, out: List[HarmonySegment], name: str) -> None:
+        out.append(HarmonySegment("recipient", name, "action", name))
+
+    def _end_message(self, out: List[HarmonySegment], terminator: str) -> None:
+        message, self._message = self._message, None
+        if message is None:
+            if terminator:
+                out.append(HarmonySegment("terminator", terminator))
+            return
+        if message["recipient"]:
+            self.tool_calls.append((message["recipient"], "".join(message["parts"]).strip()))
+        if terminator:
+            out.append(HarmonySegment("terminator", terminator, message["channel"], message["recipient"]))
+
+    def _abandon_action_input(self, out: List[HarmonySegment]) -> None:
+        text = self._json_lead + "".join(self._json)
+        self._mode = "text"
+        self._action = None
+        self._json.clear()
+        self._json_lead = ""
+        if text:
+            # A Harmony tool message stays open and still becomes a tool call
+            # with its raw text at the terminator; legacy text is just text
+            self._add_text(text, out)
+
+    def _finish_action(self, out: List[HarmonySegment], raw: str, terminator: str) -> None:
+        name = self._action
+        self._mode = "text"
+        self._action = None
+        self._json.clear()
+        self._json_lead = ""
+        self._depth = 0
+        self._in_string = self._escape = False
+        if not name:
+            return
+        message = self._message
+        if message is not None and message["recipient"] == name:
+            # Harmony tool message: it is complete now, <|call|> only closes it
+            message["parts"].append(raw)
+            self._message = None
+            channel = message["channel"]
+        else:
+            channel = "action"
+            self.messages.append({"channel": channel, "recipient": name, "parts": [raw]})
+        self.tool_calls.append((name, raw.strip()))
+        out.append(HarmonySegment("message", raw, channel, name))
+        out.append(HarmonySegment("terminator", terminator, channel, name))
+
+    @property
+    def has_tool_call(self) -> bool:
+        """True once at least one syntactically complete tool call has been seen."""
+        return bool(self.tool_calls)
+
+    @property
+    def tool_calls_settled(self) -> bool:
+        """
+        True once tool calls were parsed and the model has moved on to other output
+        (an Observation line, an analysis message, ...) instead of starting another
+        tool call. From then on, no further tool calls are expected in this response.
+        Blank lines do not count, and text that could still become "Action:" is held
+        back until it cannot.
+
+        >>> parser = HarmonyParser()
+        >>> _ = parser.feed('Action: get_weather\\nAction Input: {"city": "Paris"}\\n')
+        >>> parser.has_tool_call, parser.tool_calls_settled
+        (True, False)
+        >>> _ = parser.feed("\\nObservation: 18C")
+        >>> parser.tool_calls_settled
+        True
+        """
+        return bool(self.tool_calls) and self._moved_on
+
+
+def _plain_channel_answer(text: str) -> str:
+    """
+    Handles output where the channel tokens were rendered as plain words, e.g.
+    "analysisThe user asks...assistantfinalThe answer is 4".
+    """
+    if not text.lstrip().lower().startswith("analysis"):
+        return text
+    lowered = text.lower()
+    marker = lowered.rfind("assistantfinal")
+    if marker >= 0:
+        return text[marker + len("assistantfinal"):]
+    marker = lowered.rfind("final")
+    return text[marker + len("final"):] if marker >= 0 else text
+
+
+def parse_harmony_output(text: str) -> HarmonyParser:
+    """Parses a complete response in one pass and returns the parser state."""
+    parser = HarmonyParser()
+    parser.feed(text)
+    parser.close()
+    return parser
+
+
+def parse_tool_arguments(raw: str) -> Dict[str, Any]:
+    """Decodes tool call arguments, falling back to {"input": raw} for non-JSON input."""
+    try:
+        args = json.loads(raw)
+    except json.JSONDecodeError:
+        return {"input": raw}
+    return args if isinstance(args, dict) else {"input": args}
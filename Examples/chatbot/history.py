@@ -0,0 +1,221 @@
+"""
+Token-budgeted chat history for the chatbot.
+
+Instead of re-sending the whole session every turn, HistoryManager keeps the
+system prompt plus as many of the most recent messages as fit in max_tokens.
+Messages that fall out of the window are folded into a rolling summary, which is
+refreshed lazily: only once summarize_every turns have dropped out since the
+last refresh, so most requests do no extra work. Until then those messages are
+covered by an interim summary (the start of each message, as
+extractive_summarizer does) that shares the summary budget, so the window itself
+never grows past max_tokens. Token counts come from a pluggable tokenizer and
+are memoized per message.
+"""
+import math
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from harmony import parse_harmony_output
+
+MIN_LINE_CHARS = 40  # shortest a summary line is cut to before lines are dropped
+
+SUMMARY_PROMPT = """
+    Summarize the conversation below for another assistant that will continue it.
+    Keep names, facts, decisions and open questions. Be brief.
+"""
+
+
+def heuristic_token_count(text: str, chars_per_token: float = 4.0) -> int:
+    """Rough token estimate, about 4 characters per token for English text."""
+    return math.ceil(len(text) / chars_per_token) if text else 0
+
+
+def make_token_counter(tokenizer: Any = None) -> Callable[[str], int]:
+    """
+    Returns a text -> token count function. tokenizer can be such a function, or any
+    object with an encode() method (a tiktoken encoding, a Hugging Face tokenizer).
+    With None, the character heuristic is used.
+    """
+    if tokenizer is None:
+        return heuristic_token_count
+    if hasattr(tokenizer, "encode"):
+        return lambda text: len(tokenizer.encode(text)) if text else 0
+    return tokenizer
+
+
+def llm_summarizer(llm: Any, max_tokens: int = 256) -> Callable[[str, List[Dict[str, str]]], str]:
+    """
+    Summarizer that asks llm to fold messages into the previous summary.
+    """
+    def summarize(previous: str, messages: List[Dict[str, str]]) -> str:
+        lines = [f"Earlier summary: {previous}"] if previous else []
+        lines += [f"{msg['role']}: {msg['content']}" for msg in messages]
+        reply = llm.invoke(
+            [SystemMessage(content=SUMMARY_PROMPT), HumanMessage(content="\n".join(lines))],
+            max_tokens=max_tokens,
+        )
+        return parse_harmony_output(reply.content).final_text().strip()
+    return summarize
+
+
+def extractive_summarizer(previous: str, messages: List[Dict[str, str]], max_chars: int = 200) -> str:
+    """
+    Fallback summarizer that needs no model: keeps the start of every message.
+    """
+    lines = [previous] if previous else []
+    for msg in messages:
+        content = " ".join(msg["content"].split())
+        if len(content) > max_chars:
+            content = content[:max_chars].rstrip() + "..."
+        lines.append(f"{msg['role']}: {content}")
+    return "\n".join(lines)
+
+
+class HistoryManager:
+    def __init__(
+        self,
+        system_prompt: str,
+        max_tokens: int = 2048,
+        summary_tokens: int = 256,
+        summarize_every: int = 4,
+        tokenizer: Any = None,
+        summarizer: Optional[Callable[[str, List[Dict[str, str]]], str]] = None,
+    ):
+        """
+        Args:
+            system_prompt: Always sent first.
+            max_tokens: Budget for the system prompt, summary and recent messages together.
+            summary_tokens: Tokens reserved for the rolling summary; longer summaries are shortened line by line.
+            summarize_every: Refresh the summary once this many turns (user + assistant) have dropped out of the window;
+                until then they get a cheap interim summary.
+            tokenizer: Token counter, see make_token_counter. Defaults to the character heuristic.
+            summarizer: (previous summary, dropped messages) -> new summary. Defaults to extractive_summarizer.
+        """
+        self.system_prompt = system_prompt
+        self.max_tokens = max_tokens
+        self.summary_tokens = summary_tokens
+        self.summarize_every = summarize_every
+        self.count_tokens = make_token_counter(tokenizer)
+        self.summarizer = summarizer or extractive_summarizer
+
+        self._counts: Dict[str, int] = {}
+        self._summary = ""
+        self._summarized = 0  # messages already folded into the summary
+        self._interim = ((), "")  # (key of the dropped span, interim summary)
+        self._stats = {"requests": 0, "summaries": 0, "dropped_messages": 0, "last_tokens": 0}
+
+    # -----------------------------
+    # Public API
+    # -----------------------------
+    def build(self, messages: Sequence[Dict[str, str]]) -> List[BaseMessage]:
+        """
+        Turns chat history entries ({"role", "content"}) into the messages to send,
+        oldest first, within max_tokens.
+        """
+        if len(messages) < self._summarized:
+            # The history was cleared or replaced
+            self.reset()
+
+        budget = self.max_tokens - self._count(self.system_prompt)
+        start = self._window_start(messages, budget)
+        if start > 0 or self._summary:
+            # Something is summarized, so the summary's share comes out of the window
+            start = self._window_start(messages, budget - self.summary_tokens)
+        # Messages before _summarized are already in the summary
+        start = max(start, self._summarized)
+
+        if start - self._summarized >= 2 * self.summarize_every:
+            self._refresh_summary(messages[self._summarized:start])
+            self._summarized = start
+        summary = self._summary_for(messages, start)
+
+        history: List[BaseMessage] = [SystemMessage(content=self.system_prompt)]
+        if summary:
+            history.append(SystemMessage(content=f"Summary of the earlier conversation:\n{summary}"))
+        for msg in messages[start:]:
+            cls = HumanMessage if msg["role"] == "user" else AIMessage
+            history.append(cls(content=msg["content"]))
+
+        self._stats["requests"] += 1
+        self._stats["dropped_messages"] = start  # messages outside the window
+        self._stats["last_tokens"] = sum(self._count(m.content) for m in history)
+        return history
+
+    def reset(self) -> None:
+        self._summary = ""
+        self._summarized = 0
+        self._interim = ((), "")
+
+    @property
+    def summary(self) -> str:
+        return self._summary
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats["summarized_messages"] = self._summarized
+        stats["summary_tokens"] = self._count(self._summary)
+        return stats
+
+    # -----------------------------
+    # Internals
+    # -----------------------------
+    def _count(self, text: str) -> int:
+        count = self._counts.get(text)
+        if count is None:
+            if len(self._counts) >= 4096:
+                self._counts.clear()
+            count = self._counts[text] = self.count_tokens(text)
+        return count
+
+    def _window_start(self, messages: Sequence[Dict[str, str]], budget: int) -> int:
+        """Index of the oldest message that still fits, walking back from the newest."""
+        start = len(messages)
+        while start > 0:
+            cost = self._count(messages[start - 1]["content"])
+            if cost > budget:
+                break
+            budget -= cost
+            start -= 1
+        # Open the window on a user turn so the model never sees a dangling reply
+        while start < len(messages) and messages[start]["role"] != "user":
+            start += 1
+        return start
+
+    def _summary_for(self, messages: Sequence[Dict[str, str]], start: int) -> str:
+        """
+        The summary to send: the rolling summary, plus an interim extractive summary
+        of the messages that dropped out since the last refresh.
+        """
+        if start <= self._summarized:
+            return self._summary
+        pending = messages[self._summarized:start]
+        key = (self._summary, self._summarized, start, pending[-1]["content"])
+        if self._interim[0] != key:
+            self._interim = (key, self._fit_summary(extractive_summarizer(self._summary, list(pending))))
+        return self._interim[1]
+
+    def _refresh_summary(self, dropped: Sequence[Dict[str, str]]) -> None:
+        self._summary = self._fit_summary(self.summarizer(self._summary, list(dropped)))
+        self._stats["summaries"] += 1
+
+    def _fit_summary(self, summary: str) -> str:
+        """
+        Cuts a summary down to summary_tokens. Every line (with extractive_summarizer,
+        one per message) is shortened to an equal share first, so the oldest facts
+        are not the first to go; if that is not enough, lines are dropped from the
+        middle, keeping the oldest and the newest.
+        """
+        tokens = self._count(summary)
+        if tokens <= self.summary_tokens:
+            return summary
+        chars = max(1, int(len(summary) * self.summary_tokens / tokens))
+        lines = [line for line in summary.split("\n") if line.strip()]
+        share = max(MIN_LINE_CHARS, chars // len(lines) - 4)  # room for "..." and the newline
+        lines = [line if len(line) <= share else line[:share].rstrip() + "..." for line in lines]
+        while len(lines) > 2 and self._count("\n".join(lines)) > self.summary_tokens:
+            del lines[len(lines) // 2]
+        summary = "\n".join(lines)
+        if self._count(summary) > self.summary_tokens:
+            summary = summary[:chars]
+        return summary
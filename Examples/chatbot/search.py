@@ -0,0 +1,211 @@
+"""
+Internet search tool for the chatbot agent.
+
+SearchService sits between the agent and a search provider:
+
+- results are cached per normalized query ("What is RAG?" and "what is rag")
+  with a TTL and an LRU bound, since agents often repeat a query in
+  consecutive steps
+- identical queries that are already running share one provider call
+- every call has a hard deadline, after which the agent gets a timeout message
+  instead of blocking its step
+- results pointing at the same page (http/https, www., tracking parameters,
+  fragments) are returned once
+
+All searches run on the shared spin_loop, so sync and async callers from any
+thread see the same cache and in-flight requests. DDGSProvider uses DuckDuckGo;
+FakeSearchProvider returns canned results for tests and benchmarks.
+"""
+import asyncio
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Tuple, Union
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from SpinLLM import spin_loop
+
+Result = Dict[str, str]  # {"title", "body", "href"}
+
+_NOT_WORD = re.compile(r"[^\w\s]+")
+_TRACKING_PARAMS = re.compile(r"^(utm_\w+|fbclid|gclid|ref|ref_src)$")
+
+
+def normalize_query(query: str) -> str:
+    """Case, punctuation and spacing differences do not change a search."""
+    return " ".join(_NOT_WORD.sub(" ", query.casefold()).split())
+
+
+def normalize_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query) if not _TRACKING_PARAMS.match(k)))
+    return f"{host}{parts.path.rstrip('/')}" + (f"?{query}" if query else "")
+
+
+def dedup_results(results: List[Result]) -> List[Result]:
+    seen = set()
+    unique = []
+    for r in results:
+        key = normalize_url(r.get("href", "")) or " ".join(r.get("body", "").split())
+        if key in seen:
+            continue
+        seen.add(key)
+        unique.append(r)
+    return unique
+
+
+def format_results(results: List[Result]) -> str:
+    if not results:
+        return "No results found."
+    return "\n\n".join(
+        f"{r.get('title', '')}\n{r.get('body', '')}\nSource: {r.get('href', '')}" for r in results
+    )
+
+
+# -----------------------------
+# Providers
+# -----------------------------
+class DDGSProvider:
+    """DuckDuckGo search. Each worker thread keeps its own DDGS client instead of opening one per call."""
+
+    def __init__(self, **ddgs_kwargs: Any):
+        self.ddgs_kwargs = ddgs_kwargs
+        self._local = threading.local()
+
+    def search(self, query: str, max_results: int) -> List[Result]:
+        client = getattr(self._local, "client", None)
+        if client is None:
+            from ddgs import DDGS
+
+            client = self._local.client = DDGS(**self.ddgs_kwargs)
+        return list(client.text(query, max_results=max_results) or [])
+
+
+class FakeSearchProvider:
+    """
+    Canned results for tests and benchmarks: a dict of query -> results, or a
+    function of (query, max_results). delay stands in for network latency and
+    calls records every query that reached the provider.
+    """
+
+    def __init__(self, results: Union[Dict[str, List[Result]], Callable[[str, int], List[Result]]], delay: float = 0.0):
+        self.results = results
+        self.delay = delay
+        self.calls: List[str] = []
+
+    async def asearch(self, query: str, max_results: int) -> List[Result]:
+        self.calls.append(query)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if callable(self.results):
+            return self.results(query, max_results)[:max_results]
+        return list(self.results.get(query, []))[:max_results]
+
+
+# -----------------------------
+# Service
+# -----------------------------
+class SearchService:
+    def __init__(
+        self,
+        provider: Any = None,
+        max_results: int = 5,
+        deadline: float = 8.0,
+        ttl: float = 600.0,
+        max_entries: int = 256,
+    ):
+        """
+        Args:
+            provider: Object with search(query, max_results) or async asearch(query, max_results). Defaults to DDGSProvider.
+            max_results: Results requested per query (before URL dedup).
+            deadline: Seconds a call may take before the agent gets a timeout message.
+            ttl: Seconds a cached result stays valid.
+            max_entries: Number of cached queries.
+        """
+        self.provider = provider if provider is not None else DDGSProvider()
+        self.max_results = max_results
+        self.deadline = deadline
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        # Only touched from the spin_loop thread
+        self._cache: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._counters = {"hits": 0, "misses": 0, "coalesced": 0, "timeouts": 0, "errors": 0, "duplicates_dropped": 0}
+
+    def search(self, query: str) -> str:
+        """Sync entry point for the agent tool."""
+        return spin_loop.run(self._search(query))
+
+    async def asearch(self, query: str) -> str:
+        """Async entry point for the agent tool."""
+        return await spin_loop.arun(self._search(query))
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self._counters)
+        lookups = stats["hits"] + stats["misses"] + stats["coalesced"]
+        stats["hit_rate"] = (stats["hits"] + stats["coalesced"]) / lookups if lookups else 0.0
+        stats["entries"] = len(self._cache)
+        return stats
+
+    # -----------------------------
+    # Internals (run on spin_loop)
+    # -----------------------------
+    async def _search(self, query: str) -> str:
+        key = normalize_query(query)
+        if not key:
+            return "No results found."
+
+        entry = self._cache.get(key)
+        if entry is not None and time.monotonic() - entry[1] <= self.ttl:
+            self._cache.move_to_end(key)
+            self._counters["hits"] += 1
+            return entry[0]
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self._counters["coalesced"] += 1
+        else:
+            self._counters["misses"] += 1
+            future = self._inflight[key] = asyncio.ensure_future(self._fetch(key, query))
+            future.add_done_callback(lambda f: self._fetch_done(key, f))
+        try:
+            # shield: one caller giving up must not cancel the fetch for the others
+            return await asyncio.wait_for(asyncio.shield(future), self.deadline)
+        except asyncio.TimeoutError:
+            self._counters["timeouts"] += 1
+            return f"Internet search timed out after {self.deadline:g}s."
+        except Exception as e:
+            return f"Internet search failed : {str(e)}"
+
+    def _fetch_done(self, key: str, future: asyncio.Future) -> None:
+        self._inflight.pop(key, None)
+        if not future.cancelled():
+            future.exception()  # retrieved, even if every caller already timed out
+
+    async def _fetch(self, key: str, query: str) -> str:
+        if hasattr(self.provider, "asearch"):
+            call = self.provider.asearch(query, self.max_results)
+        else:
+            call = asyncio.to_thread(self.provider.search, query, self.max_results)
+        try:
+            # A fetch that outlives its callers still fills the cache, but a hung
+            # provider must not hold the in-flight slot forever
+            results = await asyncio.wait_for(call, self.deadline * 3)
+        except Exception:
+            self._counters["errors"] += 1
+            raise
+
+        unique = dedup_results(results)
+        self._counters["duplicates_dropped"] += len(results) - len(unique)
+        text = format_results(unique)
+
+        self._cache[key] = (text, time.monotonic())
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return text
@@ -0,0 +1,170 @@
+"""
+Execution layer for sync agent tools.
+
+Tools built with Tool.from_function are plain blocking functions. Called
+directly, a slow network lookup blocks the thread driving the agent, and on the
+async path it stalls the event loop for every other session. ToolExecutor runs
+them on bounded thread pools instead:
+
+- each tool has a ToolLimits: a timeout covering queue wait plus run time, and
+  an optional concurrency cap (its own pool of that many workers). Tools that
+  name the same pool share it and its cap, e.g. at most 4 concurrent yfinance
+  calls across all stock tools; tools without a cap share the default pool
+- a call that times out is cancelled if it has not started yet, and the agent
+  gets an error message instead of waiting (a running thread cannot be killed,
+  it finishes in the background)
+- queue wait and run time are recorded per tool
+
+executor.wrap(tool) returns a copy of the tool whose func and coroutine go
+through the executor. A tool that already has its own coroutine keeps it.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+
+class ToolLimits(NamedTuple):
+    timeout: Optional[float] = 30.0
+    max_concurrency: Optional[int] = None
+    pool: Optional[str] = None  # tools naming the same pool share its workers
+
+
+class ToolTimeoutError(TimeoutError):
+    pass
+
+
+class ToolExecutor:
+    def __init__(self, max_workers: int = 16, default: ToolLimits = ToolLimits(), limits: Optional[Dict[str, ToolLimits]] = None):
+        """
+        Args:
+            max_workers: Size of the pool shared by tools without a concurrency cap.
+            default: Limits for tools without their own entry.
+            limits: Per-tool limits, keyed by tool name.
+        """
+        self.max_workers = max_workers
+        self.default = default
+        self.limits = dict(limits or {})
+
+        self._pools: Dict[str, ThreadPoolExecutor] = {}
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Dict[str, float]] = {}
+
+    # -----------------------------
+    # Running tools
+    # -----------------------------
+    def run(self, name: str, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Runs func on the tool's pool and waits for it, up to the tool's timeout."""
+        future = self._submit(name, func, args, kwargs)
+        timeout = self._limits(name).timeout
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            self._timed_out(name, future)
+            raise ToolTimeoutError(f"Tool {name} timed out after {timeout:g}s.") from None
+
+    async def arun(self, name: str, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Like run, but awaits the result without blocking the event loop."""
+        future = self._submit(name, func, args, kwargs)
+        timeout = self._limits(name).timeout
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+        except asyncio.TimeoutError:
+            self._timed_out(name, future)
+            raise ToolTimeoutError(f"Tool {name} timed out after {timeout:g}s.") from None
+
+    def wrap(self, tool: Any) -> Any:
+        """
+        Returns a copy of a LangChain Tool that runs through this executor. A timeout
+        comes back to the agent as the tool's text output; other errors propagate.
+        """
+        name, func = tool.name, tool.func
+
+        def run_sync(*args: Any, **kwargs: Any) -> Any:
+            try:
+                return self.run(name, func, *args, **kwargs)
+            except ToolTimeoutError as e:
+                return str(e)
+
+        async def run_async(*args: Any, **kwargs: Any) -> Any:
+            try:
+                return await self.arun(name, func, *args, **kwargs)
+            except ToolTimeoutError as e:
+                return str(e)
+
+        update = {"func": run_sync}
+        if getattr(tool, "coroutine", None) is None:
+            update["coroutine"] = run_async
+        return tool.model_copy(update=update)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Per-tool call counts, and mean/max queue wait and run time in seconds."""
+        with self._lock:
+            metrics = {name: dict(m) for name, m in self._metrics.items()}
+        for m in metrics.values():
+            started = m["completed"] + m["errors"]
+            m["queue_wait_mean"] = m["queue_wait_total"] / started if started else 0.0
+            m["run_time_mean"] = m["run_time_total"] / started if started else 0.0
+        return metrics
+
+    def shutdown(self, wait: bool = False) -> None:
+        with self._lock:
+            pools, self._pools = list(self._pools.values()), {}
+        for pool in pools:
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+    # -----------------------------
+    # Internals
+    # -----------------------------
+    def _limits(self, name: str) -> ToolLimits:
+        return self.limits.get(name, self.default)
+
+    def _pool(self, name: str) -> ThreadPoolExecutor:
+        limits = self._limits(name)
+        cap = limits.max_concurrency
+        key = (limits.pool or name) if cap else ""
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = self._pools[key] = ThreadPoolExecutor(
+                    max_workers=cap or self.max_workers, thread_name_prefix=f"tool-{key or 'shared'}"
+                )
+            return pool
+
+    def _submit(self, name: str, func: Callable[..., Any], args: tuple, kwargs: dict) -> Future:
+        submitted = time.perf_counter()
+
+        def call() -> Any:
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except BaseException:
+                self._record(name, "errors", started - submitted, time.perf_counter() - started)
+                raise
+            self._record(name, "completed", started - submitted, time.perf_counter() - started)
+            return result
+
+        self._record(name, "calls")
+        return self._pool(name).submit(call)
+
+    def _timed_out(self, name: str, future: Future) -> None:
+        self._record(name, "timeouts")
+        if future.cancel():
+            self._record(name, "cancelled")
+
+    def _record(self, name: str, counter: str, queue_wait: float = 0.0, run_time: float = 0.0) -> None:
+        with self._lock:
+            m = self._metrics.get(name)
+            if m is None:
+                m = self._metrics[name] = {
+                    "calls": 0, "completed": 0, "errors": 0, "timeouts": 0, "cancelled": 0,
+                    "queue_wait_total": 0.0, "queue_wait_max": 0.0, "run_time_total": 0.0, "run_time_max": 0.0,
+                }
+            m[counter] += 1
+            if counter in ("completed", "errors"):
+                m["queue_wait_total"] += queue_wait
+                m["queue_wait_max"] = max(m["queue_wait_max"], queue_wait)
+                m["run_time_total"] += run_time
+                m["run_time_max"] = max(m["run_time_max"], run_time)
@@ -0,0 +1,167 @@
+"""
+Size limits for tool outputs before they are inlined into the Spin prompt.
+
+A single tool result (five search snippets, a financial table dumped with
+to_dict()) can be larger than the rest of the conversation. ToolOutputLimiter
+shapes each result according to a per-tool ToolOutputPolicy:
+
+- dedup: drop repeated blocks (e.g. the same snippet returned by two sources)
+- fields: keep only whitelisted keys of a dict / list of dicts
+- compact_json: re-serialize structured output without whitespace
+- max_chars with strategy "head", "tail" or "head_tail": hard cap on the result
+
+It records input/output sizes per tool, so the bytes saved can be reported.
+"""
+import ast
+import json
+import re
+import threading
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+_TIMESTAMP = re.compile(r"Timestamp\('([^']*)'\)")
+_NAN = re.compile(r"\bnan\b")
+
+
+class ToolOutputPolicy(NamedTuple):
+    max_chars: int = 2000
+    strategy: str = "head_tail"  # "head", "tail" or "head_tail"
+    fields: Optional[Tuple[str, ...]] = None
+    compact_json: bool = True
+    dedup: bool = True
+
+
+def parse_structured(text: str) -> Any:
+    """
+    Parses tool output that is JSON or a Python literal (what str() of a dict
+    gives, including pandas Timestamp keys and nan values). Returns None for
+    plain text.
+    """
+    stripped = text.strip()
+    if not stripped or stripped[0] not in "{[":
+        return None
+    try:
+        return json.loads(stripped)
+    except ValueError:
+        pass
+    try:
+        return ast.literal_eval(_NAN.sub("None", _TIMESTAMP.sub(r"'\1'", stripped)))
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        return None
+
+
+def select_fields(obj: Any, fields: Tuple[str, ...]) -> Any:
+    if isinstance(obj, dict):
+        return {k: v for k, v in obj.items() if k in fields}
+    if isinstance(obj, list):
+        return [select_fields(item, fields) for item in obj]
+    return obj
+
+
+def _compact_value(obj: Any) -> Any:
+    """Whole floats become ints and date-like keys lose their midnight time."""
+    if isinstance(obj, dict):
+        return {_compact_key(k): _compact_value(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_compact_value(v) for v in obj]
+    if isinstance(obj, float) and obj.is_integer():
+        return int(obj)
+    return obj
+
+
+def _compact_key(key: Any) -> str:
+    key = str(key)
+    return key[:-9] if key.endswith(" 00:00:00") else key
+
+
+def dedup_blocks(text: str) -> str:
+    """Drops blocks (separated by blank lines) whose normalized text was already seen."""
+    blocks = text.split("\n\n")
+    if len(blocks) < 2:
+        return text
+    seen = set()
+    kept = []
+    for block in blocks:
+        norm = " ".join(block.split()).lower()
+        if norm and norm in seen:
+            continue
+        seen.add(norm)
+        kept.append(block)
+    return "\n\n".join(kept)
+
+
+def truncate(text: str, max_chars: int, strategy: str = "head_tail") -> str:
+    if max_chars <= 0 or len(text) <= max_chars:
+        return text
+    # The marker counts towards max_chars; its length depends on the number of
+    # chars cut, so settle it before slicing
+    keep = max_chars
+    for _ in range(3):
+        marker = f" ...[{len(text) - keep} chars truncated]... "
+        keep = max_chars - len(marker)
+    if keep <= 0:
+        return text[:max_chars]
+    if strategy == "head":
+        return text[:keep] + marker
+    if strategy == "tail":
+        return marker + text[-keep:]
+    head = keep * 2 // 3
+    return text[:head] + marker + text[len(text) - (keep - head):]
+
+
+class ToolOutputLimiter:
+    def __init__(self, default: ToolOutputPolicy = ToolOutputPolicy(), policies: Optional[Dict[str, ToolOutputPolicy]] = None):
+        """
+        Args:
+            default: Policy for tools without their own entry.
+            policies: Per-tool policies, keyed by tool name.
+        """
+        self.default = default
+        self.policies = dict(policies or {})
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def policy(self, tool_name: Optional[str]) -> ToolOutputPolicy:
+        return self.policies.get(tool_name or "", self.default)
+
+    def shape(self, tool_name: Optional[str], content: str) -> str:
+        policy = self.policy(tool_name)
+        text = content
+
+        obj = parse_structured(text) if (policy.fields or policy.compact_json) else None
+        if obj is not None:
+            if policy.fields:
+                obj = select_fields(obj, policy.fields)
+            if policy.compact_json:
+                compact = json.dumps(_compact_value(obj), separators=(",", ":"), ensure_ascii=False, default=str)
+                if policy.fields or len(compact) < len(text):
+                    text = compact
+            elif policy.fields:
+                text = str(obj)
+        elif policy.dedup:
+            text = dedup_blocks(text)
+
+        text = truncate(text, policy.max_chars, policy.strategy)
+        self._record(tool_name or "", content, text)
+        return text
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            per_tool = {name: dict(s) for name, s in self._stats.items()}
+        totals = {"calls": 0, "shaped": 0, "bytes_in": 0, "bytes_out": 0}
+        for s in per_tool.values():
+            for k in totals:
+                totals[k] += s[k]
+        totals["bytes_saved"] = totals["bytes_in"] - totals["bytes_out"]
+        totals["tools"] = per_tool
+        return totals
+
+    def _record(self, tool_name: str, before: str, after: str) -> None:
+        size_in = len(before.encode("utf-8"))
+        size_out = len(after.encode("utf-8"))
+        with self._lock:
+            s = self._stats.setdefault(tool_name, {"calls": 0, "shaped": 0, "bytes_in": 0, "bytes_out": 0, "bytes_saved": 0})
+            s["calls"] += 1
+            s["shaped"] += after != before
+            s["bytes_in"] += size_in
+            s["bytes_out"] += size_out
+            s["bytes_saved"] += size_in - size_out
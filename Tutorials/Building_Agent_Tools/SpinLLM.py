@@ -1,4 +1,4 @@
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 from langchain.chat_models.base import BaseChatModel
 from langchain.messages import AIMessage, HumanMessage, SystemMessage, ToolCall, ToolMessage
 from langchain_core.messages import BaseMessage
@@ -7,7 +7,57 @@ from langchain_core.outputs import ChatGeneration
 from SpiLLI.SpinLLI import Spin
 import json
 import re
+import uuid
 import asyncio
+import threading
+
+_ACTION = re.compile(r"\bAction:\s*([\w.\-]+)")
+_ACTION_INPUT = re.compile(r"Action Input:\s*(?=\{)")
+
+
+def parse_tool_calls(text: str) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    All (tool name, arguments) pairs written as Action: / Action Input: {...}
+    blocks, in order. Text between the tool name and "Action Input:" is ignored;
+    input that is not valid JSON is passed on as {"input": raw}.
+    """
+    calls = []
+    decoder = json.JSONDecoder()
+    pos = 0
+    while True:
+        action = _ACTION.search(text, pos)
+        if action is None:
+            return calls
+        following = _ACTION.search(text, action.end())
+        stop = following.start() if following else len(text)
+        action_input = _ACTION_INPUT.search(text, action.end(), stop)
+        if action_input is None:
+            # An Action without input, look for the next one
+            pos = action.end()
+            continue
+        try:
+            args, pos = decoder.raw_decode(text, action_input.end())
+        except json.JSONDecodeError:
+            pos = text.rfind("}", action_input.end(), stop) + 1 or stop
+            args = {"input": text[action_input.end():pos].strip()}
+        calls.append((action.group(1), args if isinstance(args, dict) else {"input": args}))
+
+
+# One long-lived loop for all Spin requests, so sync calls (invoke) and async
+# calls (ainvoke, as in the tutorial notebook) take the same path, and a sync
+# call also works where an event loop is already running, as in Jupyter
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _spin_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="spin-event-loop", daemon=True).start()
+        return _loop
+
 
 class SpinChatModel(BaseChatModel):
     """
@@ -24,6 +74,7 @@ class SpinChatModel(BaseChatModel):
 
     tools: Optional[List[Any]] = None  # Tool objects or dicts
     tool_choice: Any = None
+    parallel_tool_calls: bool = True  # allow several tool calls in one response
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -40,27 +91,9 @@ class SpinChatModel(BaseChatModel):
         Converts messages to a prompt, runs Spin, and returns a ChatResult with AIMessage.
         """
         prompt = self._convert_messages_to_prompt(messages)
-        response_text = await self._call_spin(prompt)
-        # Detect LangChain-style tool call
-        action_match = re.search(r"Action:\s*(\w+)", response_text)
-        input_match = re.search(r"Action Input:\s*(\{.*\})", response_text, re.DOTALL)
-    
-        if action_match and input_match:
-            tool_name = action_match.group(1)
-            try:
-                tool_args = json.loads(input_match.group(1))
-            except json.JSONDecodeError:
-                tool_args = {"input": input_match.group(1)}
-    
-            tool_call = ToolCall(
-                id=f"call_{tool_name}_{hash(response_text) % 10000}",
-                name=tool_name,
-                args=tool_args,
-            )
-            msg = AIMessage(content="", tool_calls=[tool_call])
-        else:
-            msg = AIMessage(content=response_text)
-        return ChatResult(generations=[ChatGeneration(message=msg)])
+        future = asyncio.run_coroutine_threadsafe(self._call_spin(prompt), _spin_loop())
+        response_text = await asyncio.wrap_future(future)
+        return ChatResult(generations=[ChatGeneration(message=self._message_from_response(response_text))])
     def _generate(
         self, messages: List[BaseMessage], stop: Optional[List[str]] = None, **kwargs
     ) -> ChatResult:
@@ -68,27 +101,28 @@ class SpinChatModel(BaseChatModel):
         Converts messages to a prompt, runs Spin, and returns a ChatResult with AIMessage.
         """
         prompt = self._convert_messages_to_prompt(messages)
-        response_text = asyncio.run(self._call_spin(prompt))
-        # Detect LangChain-style tool call
-        action_match = re.search(r"Action:\s*(\w+)", response_text)
-        input_match = re.search(r"Action Input:\s*(\{.*\})", response_text, re.DOTALL)
-    
-        if action_match and input_match:
-            tool_name = action_match.group(1)
-            try:
-                tool_args = json.loads(input_match.group(1))
-            except json.JSONDecodeError:
-                tool_args = {"input": input_match.group(1)}
-    
-            tool_call = ToolCall(
-                id=f"call_{tool_name}_{hash(response_text) % 10000}",
-                name=tool_name,
-                args=tool_args,
-            )
-            msg = AIMessage(content="", tool_calls=[tool_call])
-        else:
-            msg = AIMessage(content=response_text)
-        return ChatResult(generations=[ChatGeneration(message=msg)])
+        future = asyncio.run_coroutine_threadsafe(self._call_spin(prompt), _spin_loop())
+        response_text = future.result()
+        return ChatResult(generations=[ChatGeneration(message=self._message_from_response(response_text))])
+
+    def _message_from_response(self, response_text: str) -> AIMessage:
+        """
+        AIMessage with one ToolCall per Action/Action Input block in the response,
+        or with the response text if it has none.
+        """
+        calls = parse_tool_calls(response_text)
+        if not calls:
+            return AIMessage(content=response_text)
+        if not self.parallel_tool_calls:
+            calls = calls[:1]
+        tool_calls = [
+            # Unique per call, so several calls to the same tool (or identical
+            # responses) never share an id
+            ToolCall(id=f"call_{uuid.uuid4().hex}", name=tool_name, args=tool_args)
+            for tool_name, tool_args in calls
+        ]
+        return AIMessage(content="", tool_calls=tool_calls)
+
     async def _call_spin(self, prompt: str) -> str:
         """
         Sends the prompt to Spin backend and returns the response.
@@ -139,6 +173,11 @@ class SpinChatModel(BaseChatModel):
             "Action Input: <JSON string of the input>\n"
             "Do not write anything else. If you already know the answer from previous tool outputs or conversation history, dont call any tools and just respond with the answer."
         )
+        if self.parallel_tool_calls:
+            formatted.append(
+                "If you need several independent tool results (for example the same lookup for different inputs), "
+                "write one Action/Action Input pair per call, one after another, in the same response."
+            )
         return "\n".join(formatted)
 
     # -----------------------------
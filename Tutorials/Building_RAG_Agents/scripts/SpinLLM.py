@@ -1,10 +1,133 @@
 # from langchain.llms.base import LLM
 from langchain_core.language_models.llms import BaseLLM
 from langchain_core.outputs import Generation, LLMResult
-from typing import Optional, List, Any, Dict
+from typing import Optional, List, Any, AsyncIterator, Dict, Iterator, Tuple, Union
 # from Spin import request_model  # Assuming `request_model` is how you query Spin
 from SpiLLI.SpinLLI import Spin
 import asyncio
+import inspect
+import threading
+
+
+class SpinEventLoop:
+    """
+    A long-lived asyncio loop running on a daemon thread.
+
+    Spin requests are executed on this loop so that sync calls do not create and
+    tear down a loop per request (asyncio.run), and so that they also work inside
+    Jupyter, where the notebook's own loop is already running on the caller's thread.
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name="spin-event-loop", daemon=True
+                )
+                self._thread.start()
+            return self._loop
+
+    def _on_loop_thread(self) -> bool:
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def run(self, coro, timeout: Optional[float] = None) -> Any:
+        """Runs a coroutine on the shared loop and blocks until it finishes."""
+        if self._on_loop_thread():
+            coro.close()
+            raise RuntimeError("SpinEventLoop.run() called from the loop thread; await the coroutine instead")
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    async def arun(self, coro) -> Any:
+        """Awaits a coroutine on the shared loop from any other event loop."""
+        if self._on_loop_thread():
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self.loop))
+
+    def iterate(self, agen: AsyncIterator[Any]) -> Iterator[Any]:
+        """Drives an async generator on the shared loop from sync code."""
+        try:
+            while True:
+                try:
+                    yield self.run(agen.__anext__())
+                except StopAsyncIteration:
+                    break
+        finally:
+            self.run(agen.aclose())
+
+    def close(self) -> None:
+        """Stops the loop thread. A later call starts a fresh one."""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(loop.stop)
+            if thread is not None:
+                thread.join()
+            loop.close()
+
+
+spin_loop = SpinEventLoop()
+
+
+class StreamLimiter:
+    """
+    Client side generation limits over a streamed response: stop sequences and a
+    character budget. feed() returns the part of each chunk that may be released.
+    Up to len(longest stop) - 1 characters are held back so a stop sequence split
+    across chunks is still caught. Once a limit is hit, done is set and the caller
+    should cancel the request.
+    """
+
+    def __init__(self, stop: Optional[List[str]] = None, max_chars: Optional[int] = None):
+        self.stop = [s for s in stop or [] if s]
+        self.max_chars = max_chars
+        self.emitted = 0
+        self.done = False
+        self.reason: Optional[str] = None  # "stop" or "length"
+        self._hold = max(map(len, self.stop), default=1) - 1
+        self._buffer = ""
+
+    def feed(self, chunk: str) -> str:
+        if self.done:
+            return ""
+        text = self._buffer + chunk
+        cut = min((i for i in (text.find(s) for s in self.stop) if i >= 0), default=-1)
+        if cut >= 0:
+            released, self._buffer = text[:cut], ""
+            self.done, self.reason = True, "stop"
+        elif self._hold:
+            split = max(0, len(text) - self._hold)
+            released, self._buffer = text[:split], text[split:]
+        else:
+            released, self._buffer = text, ""
+        return self._take(released)
+
+    def flush(self) -> str:
+        """Releases the held back tail at the end of the stream."""
+        released, self._buffer = self._buffer, ""
+        return "" if self.done else self._take(released)
+
+    def _take(self, released: str) -> str:
+        if self.max_chars is not None and self.emitted + len(released) >= self.max_chars:
+            released = released[:max(0, self.max_chars - self.emitted)]
+            self.done = True
+            self.reason = self.reason or "length"
+            self._buffer = ""
+        self.emitted += len(released)
+        return released
+
 
 class SpinLLM(BaseLLM):
     model_name: str
@@ -14,6 +137,11 @@ class SpinLLM(BaseLLM):
     kwargs: Dict[str, Any] = {}
     llm: Any = None
     spin:Any = None
+    max_concurrency: int = 4  # prompts in flight at once for batch calls
+    chars_per_token: float = 4.0  # heuristic for the client side max_tokens budget
+    send_generation_params: bool = True  # forward temperature/max_tokens/stop to the host
+    response_cache: Any = None  # optional ResponseCache shared by models
+    semantic_cache: Any = None  # optional SemanticCache for near-duplicate queries
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         """
@@ -27,43 +155,176 @@ class SpinLLM(BaseLLM):
         """
         self.spin = spin = Spin(self.encryption_path)
         self.llm = self.spin.request({"model":self.model_name})   
-    def _generate(self, prompts, stop=None, **kwargs) -> LLMResult:
-        generations = []
-        for prompt in prompts:
-            text = self._call(prompt, stop=stop, **kwargs)
-            gen = Generation(text=text)
-            generations.append([gen])
+    def _generate(self, prompts, stop=None, run_manager=None, **kwargs) -> LLMResult:
+        if len(prompts) == 1:
+            return LLMResult(generations=[[Generation(text=self._call(prompts[0], stop=stop, **kwargs))]])
+        return spin_loop.run(self._agenerate(prompts, stop=stop, **kwargs))
 
-        return LLMResult(generations=generations)
+    async def _agenerate(self, prompts, stop=None, run_manager=None, **kwargs) -> LLMResult:
+        """
+        Runs all prompts concurrently, at most max_concurrency at a time, and
+        returns the generations in prompt order. A failing prompt does not abort
+        the batch: its generation is empty and carries the error in generation_info.
+        The batch only raises if every prompt failed.
+        """
+        results = [None] * len(prompts)
+        async for index, result in self.agenerate_as_completed(prompts, stop=stop, **kwargs):
+            results[index] = result
+
+        errors = [r for r in results if isinstance(r, Exception)]
+        if errors and len(errors) == len(results):
+            raise errors[0]
 
-    async def _agenerate(self, prompts, stop=None, **kwargs) -> LLMResult:
         generations = []
-        for prompt in prompts:
-            text = await self._acall(prompt, stop=stop, **kwargs)
-            gen = Generation(text=text)
+        for result in results:
+            if isinstance(result, Exception):
+                gen = Generation(text="", generation_info={"error": repr(result)})
+            else:
+                gen = Generation(text=result)
             generations.append([gen])
 
         return LLMResult(generations=generations)
+
+    async def agenerate_as_completed(
+        self, prompts: List[str], stop: Optional[List[str]] = None, **kwargs
+    ) -> AsyncIterator[Tuple[int, Union[str, Exception]]]:
+        """
+        Yields (index, text) pairs as soon as each prompt finishes, for offline
+        evaluation jobs that want to process results before the whole batch is done.
+        A failed prompt yields (index, exception) instead of raising.
+        """
+        semaphore = asyncio.Semaphore(max(1, self.max_concurrency))
+
+        async def run_one(index: int, prompt: str) -> Tuple[int, Union[str, Exception]]:
+            async with semaphore:
+                try:
+                    return index, await self._acall(prompt, stop=stop, **kwargs)
+                except Exception as e:
+                    return index, e
+
+        tasks = [asyncio.ensure_future(run_one(i, p)) for i, p in enumerate(prompts)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def generate_as_completed(
+        self, prompts: List[str], stop: Optional[List[str]] = None, **kwargs
+    ) -> Iterator[Tuple[int, Union[str, Exception]]]:
+        """Sync counterpart of agenerate_as_completed."""
+        yield from spin_loop.iterate(self.agenerate_as_completed(prompts, stop=stop, **kwargs))
+
     def _call(self, prompt: str, stop: Optional[List[str]] = None, **kwargs) -> str:
         """Send a request to Spin and return the response."""
-        # response = request_model(
-        #     model=self.model_name,
-        #     prompt=prompt,
-        #     temperature=self.temperature,
-        #     max_tokens=self.max_tokens,
-        #     **kwargs
-        # )
-        return asyncio.run(self.llm.run({"prompt":"","query":prompt}))
+        return spin_loop.run(self._acall(prompt, stop=stop, **kwargs))
+
     async def _acall(self, prompt: str, stop: Optional[List[str]] = None, **kwargs) -> str:
-        """Send a request to Spin and return the response."""
-        # response = request_model(
-        #     model=self.model_name,
-        #     prompt=prompt,
-        #     temperature=self.temperature,
-        #     max_tokens=self.max_tokens,
-        #     **kwargs
-        # )
-        return await self.llm.run({"prompt":"","query":prompt})
+        """
+        Send a request to Spin and return the response. temperature, max_tokens and
+        stop are sent to the host, and also enforced here over the stream: the
+        request is cancelled once a stop sequence or the max_tokens budget is hit.
+        With a response_cache set, cacheable requests are answered from it when possible,
+        and with a semantic_cache set, so are queries close enough to one already answered.
+        """
+        params = {
+            "temperature": kwargs.get("temperature", self.temperature),
+            "max_tokens": kwargs.get("max_tokens", self.max_tokens),
+        }
+        if stop:
+            params["stop"] = list(stop)
+        payload = {"prompt": "", "query": prompt}
+        if self.send_generation_params:
+            payload.update(params)
+
+        cache_key = None
+        if self.response_cache is not None and self.response_cache.should_cache(params):
+            cache_key = self.response_cache.make_key(self.model_name, prompt, "", params)
+            # SQLite reads block, keep them off the event loop
+            cached = await asyncio.to_thread(self.response_cache.get, cache_key)
+            if cached is not None:
+                return cached
+
+        vector = None
+        # Answers are only reused under the same model and generation limits
+        semantic_context = (self.model_name, params["max_tokens"], tuple(stop or ()))
+        if self.semantic_cache is not None:
+            # Embedding is CPU bound, keep it off the event loop
+            cached, vector = await asyncio.to_thread(self.semantic_cache.lookup, prompt, None, semantic_context)
+            if cached is not None:
+                return cached
+
+        limiter = StreamLimiter(stop, int(params["max_tokens"] * self.chars_per_token))
+        text = await spin_loop.arun(self._collect(payload, limiter))
+        if cache_key is not None:
+            await asyncio.to_thread(self.response_cache.put, cache_key, text)
+        if self.semantic_cache is not None and limiter.reason is None:
+            # An answer cut short by max_tokens or a stop sequence is not stored
+            self.semantic_cache.add(prompt, text, vector, semantic_context)
+        return text
+
+    async def _collect(self, payload: Dict[str, Any], limiter: StreamLimiter) -> str:
+        parts = []
+        stream = self._stream_spin(payload)
+        try:
+            async for text in stream:
+                parts.append(limiter.feed(text))
+                if limiter.done:
+                    break
+            else:
+                parts.append(limiter.flush())
+        finally:
+            await stream.aclose()
+        return "".join(parts)
+
+    def _supports_chunks(self) -> bool:
+        """True if the Spin llm handle accepts an on_chunk callback in run()."""
+        try:
+            params = inspect.signature(self.llm.run).parameters
+        except (TypeError, ValueError):
+            return False
+        return "on_chunk" in params or any(p.kind is p.VAR_KEYWORD for p in params.values())
+
+    async def _stream_spin(self, payload: Dict[str, Any]) -> AsyncIterator[str]:
+        """
+        Yields response text chunks as the Spin backend delivers them, or the whole
+        response as one chunk when the installed SDK cannot stream.
+        Closing the generator early cancels the pending request.
+        """
+        if not self._supports_chunks():
+            yield await self.llm.run(payload)
+            return
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        # The SDK may call on_chunk from its own thread, so hop back onto our loop.
+        on_chunk = lambda chunk: loop.call_soon_threadsafe(queue.put_nowait, chunk)
+        task = asyncio.ensure_future(self.llm.run(payload, on_chunk=on_chunk))
+        streamed = False
+        try:
+            while True:
+                getter = asyncio.ensure_future(queue.get())
+                done, _ = await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+                if getter not in done:
+                    getter.cancel()
+                    break
+                if getter.result():
+                    streamed = True
+                    yield getter.result()
+            # Let callbacks scheduled right before completion land, then drain them.
+            await asyncio.sleep(0)
+            while not queue.empty():
+                chunk = queue.get_nowait()
+                if chunk:
+                    streamed = True
+                    yield chunk
+            result = task.result()
+            if not streamed and result:
+                yield result
+        finally:
+            if not task.done():
+                task.cancel()
 
     @property
     def _identifying_params(self) -> Dict[str, Any]:
@@ -0,0 +1,257 @@
+"""
+Compressed approximate FAISS indexes for large RAG corpora.
+
+FAISS.from_documents builds a flat index: exact, but memory and query time grow
+linearly with the corpus (a million 384-d chunks is 1.5 GB of float32 scanned on
+every query). This module derives a compressed index from the flat one:
+
+- "flat": the exact index, kept as is
+- "ivf_sq8": vectors are clustered into nlist inverted lists (IVF) and stored
+  as int8 (4x smaller); a query scans only the nprobe closest lists
+- "ivf_pq": IVF with product quantization, m bytes per vector (e.g. 48 bytes
+  instead of 1536 for 384-d)
+
+plan_index() picks the most accurate mode that fits a memory budget, and the
+index is trained on a random sample of the corpus. The compressed store is a
+read-only copy: IndexManager keeps the flat index as the source of truth, and
+the compressed one is rebuilt from it after a sync (IVF ids are not renumbered
+on delete the way LangChain's FAISS wrapper expects).
+
+Running this file benchmarks recall@k and query latency of every mode against
+the flat index on the same data, either synthetic or real embeddings (e.g. the
+vectors.npy of an MmapVectorStore, with held-out rows as queries):
+
+    python ann_index.py --n 100000 --dim 384 --budget-mb 32
+    python ann_index.py --vectors ../chroma_db/mmap_index/vectors.npy
+"""
+import time
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+MODES = ("flat", "ivf_sq8", "ivf_pq")
+ID_BYTES = 8  # every vector in an inverted list also stores its int64 id
+
+
+class IndexConfig(NamedTuple):
+    mode: str = "ivf_pq"
+    nlist: Optional[int] = None  # inverted lists; None: about 4 * sqrt(n)
+    m: int = 48  # PQ sub-quantizers (bytes per vector with nbits=8); must divide the dimension
+    nbits: int = 8
+    nprobe: int = 16  # lists scanned per query
+    train_size: int = 100_000  # vectors sampled for training
+
+
+def default_nlist(n: int) -> int:
+    # At least 39 training points per centroid, as FAISS recommends
+    return int(max(1, min(4 * np.sqrt(n), n // 39)))
+
+
+def estimate_bytes(n: int, dim: int, config: IndexConfig) -> int:
+    """Approximate size of the index in memory (codes, ids, centroids and codebooks)."""
+    if config.mode == "flat":
+        return n * dim * 4
+    nlist = config.nlist or default_nlist(n)
+    centroids = nlist * dim * 4
+    if config.mode == "ivf_sq8":
+        return n * (dim + ID_BYTES) + centroids + 2 * dim * 4
+    if config.mode == "ivf_pq":
+        codebooks = (2 ** config.nbits) * dim * 4
+        return n * (config.m * config.nbits // 8 + ID_BYTES) + centroids + codebooks
+    raise ValueError(f"Unknown index mode {config.mode!r}, expected one of {MODES}")
+
+
+def plan_index(n: int, dim: int, memory_budget_mb: float, nprobe: int = 16) -> IndexConfig:
+    """
+    Most accurate configuration that fits the budget: flat, then int8, then PQ
+    with as many sub-quantizers (bytes per vector) as fit.
+    """
+    budget = memory_budget_mb * 1024 * 1024
+    for mode in ("flat", "ivf_sq8"):
+        config = IndexConfig(mode=mode, nprobe=nprobe)
+        if estimate_bytes(n, dim, config) <= budget:
+            return config
+    for m in sorted((m for m in range(1, dim + 1) if dim % m == 0), reverse=True):
+        config = IndexConfig(mode="ivf_pq", m=m, nprobe=nprobe)
+        if estimate_bytes(n, dim, config) <= budget:
+            return config
+    raise ValueError(f"{n} vectors of dimension {dim} do not fit in {memory_budget_mb} MB")
+
+
+def build_index(vectors: np.ndarray, config: IndexConfig, metric: int = faiss.METRIC_L2, seed: int = 0) -> Any:
+    """Builds and fills a FAISS index for vectors, training it on a sample first."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, dim = vectors.shape
+    if config.mode == "flat":
+        index = faiss.IndexFlat(dim, metric)
+        index.add(vectors)
+        return index
+
+    nlist = config.nlist or default_nlist(n)
+    quantizer = faiss.IndexFlat(dim, metric)
+    if config.mode == "ivf_sq8":
+        index = faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, faiss.ScalarQuantizer.QT_8bit, metric)
+    elif config.mode == "ivf_pq":
+        if dim % config.m:
+            raise ValueError(f"m={config.m} must divide the dimension {dim}")
+        if n < 2 ** config.nbits:
+            raise ValueError(f"ivf_pq with nbits={config.nbits} needs at least {2 ** config.nbits} vectors, got {n}")
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist, config.m, config.nbits, metric)
+    else:
+        raise ValueError(f"Unknown index mode {config.mode!r}, expected one of {MODES}")
+
+    rng = np.random.default_rng(seed)
+    sample = vectors if n <= config.train_size else vectors[np.sort(rng.choice(n, config.train_size, replace=False))]
+    index.train(sample)
+    index.add(vectors)
+    index.nprobe = min(config.nprobe, nlist)
+    return index
+
+
+def set_nprobe(index: Any, nprobe: int) -> None:
+    """Changes the number of lists scanned per query (no-op for flat indexes)."""
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return
+    ivf.nprobe = min(nprobe, ivf.nlist)
+
+
+def index_bytes(index: Any) -> int:
+    return int(faiss.serialize_index(index).nbytes)
+
+
+# -----------------------------
+# LangChain integration
+# -----------------------------
+def compress_vectorstore(vectorstore: FAISS, config: IndexConfig) -> FAISS:
+    """
+    Read-only FAISS vectorstore with a compressed copy of vectorstore's index.
+    Document ids, metric and normalization are kept, so as_retriever() behaves
+    the same apart from approximate ranking.
+    """
+    flat = vectorstore.index
+    vectors = flat.reconstruct_n(0, flat.ntotal)
+    index = build_index(vectors, config, metric=flat.metric_type)
+    return FAISS(
+        vectorstore.embedding_function,
+        index,
+        InMemoryDocstore(dict(vectorstore.docstore._dict)),
+        dict(vectorstore.index_to_docstore_id),
+        relevance_score_fn=vectorstore.override_relevance_score_fn,
+        normalize_L2=vectorstore._normalize_L2,
+        distance_strategy=vectorstore.distance_strategy,
+    )
+
+
+# -----------------------------
+# Benchmark
+# -----------------------------
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    """Fraction of the true top-k neighbours that appear in the returned top-k."""
+    hits = sum(len(np.intersect1d(f[f >= 0], t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def benchmark(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    configs: Iterable[IndexConfig],
+    k: int = 10,
+    nprobes: Iterable[int] = (1, 4, 16, 64),
+    metric: int = faiss.METRIC_INNER_PRODUCT,
+) -> List[Dict[str, Any]]:
+    """
+    recall@k, mean per-query latency and index size for each config (and each
+    nprobe for IVF modes), with the flat index on the same data as ground truth.
+    Queries are run one at a time, as a retriever does.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    flat = build_index(vectors, IndexConfig(mode="flat"), metric=metric)
+    _, truth = flat.search(queries, k)
+
+    def measure(name: str, index: Any, nprobe: Optional[int], build_seconds: float) -> Dict[str, Any]:
+        found = np.empty((len(queries), k), dtype=np.int64)
+        started = time.perf_counter()
+        for i in range(len(queries)):
+            _, found[i] = index.search(queries[i:i + 1], k)
+        seconds = time.perf_counter() - started
+        return {
+            "index": name,
+            "nprobe": nprobe,
+            f"recall@{k}": round(recall_at_k(found, truth), 4),
+            "latency_ms": round(1000 * seconds / len(queries), 3),
+            "size_mb": round(index_bytes(index) / 2 ** 20, 1),
+            "build_s": round(build_seconds, 2),
+        }
+
+    rows = [measure("flat", flat, None, 0.0)]
+    for config in configs:
+        if config.mode == "flat":
+            continue
+        started = time.perf_counter()
+        index = build_index(vectors, config, metric=metric)
+        build_seconds = time.perf_counter() - started
+        name = config.mode if config.mode != "ivf_pq" else f"ivf_pq(m={config.m})"
+        for nprobe in nprobes:
+            set_nprobe(index, nprobe)
+            rows.append(measure(name, index, nprobe, build_seconds))
+    return rows
+
+
+def _clustered_corpus(n: int, dim: int, queries: int, seed: int = 0):
+    """Unit vectors around random topic centres, roughly like sentence embeddings."""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(max(1, n // 200), dim)).astype(np.float32)
+
+    def sample(count: int) -> np.ndarray:
+        x = centres[rng.integers(len(centres), size=count)] + 0.3 * rng.normal(size=(count, dim)).astype(np.float32)
+        return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+    return sample(n), sample(queries)
+
+
+def _held_out(path: str, queries: int, seed: int = 0):
+    """Corpus vectors from a .npy file, with a random subset of rows held out as queries."""
+    vectors = np.load(path, mmap_mode="r")
+    rng = np.random.default_rng(seed)
+    held = np.zeros(len(vectors), dtype=bool)
+    held[rng.choice(len(vectors), min(queries, len(vectors) // 10), replace=False)] = True
+    return np.asarray(vectors[~held]), np.asarray(vectors[held])
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="recall@k vs latency of compressed indexes against the flat index")
+    parser.add_argument("--vectors", help=".npy file of real embeddings; synthetic data if omitted")
+    parser.add_argument("--n", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--budget-mb", type=float, default=None, help="also benchmark plan_index() for this budget")
+    args = parser.parse_args()
+
+    if args.vectors:
+        vectors, queries = _held_out(args.vectors, args.queries)
+    else:
+        vectors, queries = _clustered_corpus(args.n, args.dim, args.queries)
+    n, dim = vectors.shape
+    configs = [IndexConfig(mode="ivf_sq8")]
+    if n >= 256:
+        configs.append(IndexConfig(mode="ivf_pq", m=max(m for m in range(1, dim // 8 + 1) if dim % m == 0)))
+    if args.budget_mb is not None:
+        planned = plan_index(n, dim, args.budget_mb)
+        print(f"plan_index({args.budget_mb} MB): {planned}")
+        if planned not in configs:
+            configs.append(planned)
+
+    rows = benchmark(vectors, queries, configs, k=args.k)
+    columns = list(rows[0])
+    print(" | ".join(f"{c:>12}" for c in columns))
+    for row in rows:
+        print(" | ".join(f"{str(row[c]):>12}" for c in columns))
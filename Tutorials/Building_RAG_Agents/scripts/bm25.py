@@ -0,0 +1,271 @@
+"""
+BM25 keyword index and hybrid retrieval for the RAG pipeline.
+
+Dense retrieval embeds every query and scans every vector, and it can miss
+exact terms the embedding model has never seen, such as product names like
+"SpiLLIHost". BM25Index is a small in-process inverted index, filled as
+documents are chunked. HybridRetriever combines it with the vector store in
+one of two modes:
+
+- "fusion": BM25 and vector search each return fetch_k chunks, merged with
+  reciprocal-rank fusion (score = sum of 1 / (rrf_k + rank))
+- "prefilter": only the top BM25 candidates are scored densely, against the
+  query embedding. Their vectors are read from the vector store (rows of an
+  MmapVectorStore, or reconstructed from a flat FAISS index), so the only model
+  call is the query embedding. Queries with fewer than k BM25 matches are
+  topped up from vector search.
+
+Chunks are identified by index_manager.chunk_id, so the same chunk found by
+both sides counts once. Prefilter mode expects the vector store to use chunk
+ids as document ids, as IndexManager does.
+"""
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict, PrivateAttr
+
+from index_manager import chunk_id
+
+_TOKEN = re.compile(r"\w+")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it me of on or that the this to was what when "
+    "where which who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(text.casefold()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """
+        Args:
+            k1: Term frequency saturation.
+            b: Document length normalization (0: none, 1: full).
+        """
+        self.k1 = k1
+        self.b = b
+        self.documents: List[Document] = []
+        self.ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        self._lengths: List[int] = []
+        # Postings as arrays, rebuilt on the first search after an add
+        self._arrays: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._dl: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def add_documents(self, documents: Iterable[Document]) -> int:
+        """Indexes chunks not seen before. Returns the number added."""
+        added = 0
+        for doc in documents:
+            cid = chunk_id(doc)
+            if cid in self._rows:
+                continue
+            row = self._rows[cid] = len(self.documents)
+            self.documents.append(doc)
+            self.ids.append(cid)
+            terms = tokenize(doc.page_content)
+            self._lengths.append(len(terms))
+            for term, tf in Counter(terms).items():
+                rows, tfs = self._postings.setdefault(term, ([], []))
+                rows.append(row)
+                tfs.append(tf)
+            added += 1
+        if added:
+            self._arrays, self._dl = {}, None
+        return added
+
+    def scores(self, query: str) -> Dict[int, float]:
+        """BM25 score of every row that matches at least one query term."""
+        if not self.documents:
+            return {}
+        if self._dl is None:
+            self._dl = np.asarray(self._lengths, dtype=np.float32)
+            self._dl /= max(float(self._dl.mean()), 1.0)
+        n = len(self.documents)
+        scores = np.zeros(n, dtype=np.float32)
+        matched = np.zeros(n, dtype=bool)
+        for term in set(tokenize(query)):
+            postings = self._term(term)
+            if postings is None:
+                continue
+            rows, tf = postings
+            idf = np.log1p((n - len(rows) + 0.5) / (len(rows) + 0.5))
+            scores[rows] += idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * self._dl[rows]))
+            matched[rows] = True
+        found = np.flatnonzero(matched)
+        return dict(zip(found.tolist(), scores[found].tolist()))
+
+    def search(self, query: str, k: int = 4) -> List[Tuple[Document, float]]:
+        return [(self.documents[row], score) for row, score in self.top(query, k)]
+
+    def top(self, query: str, k: int) -> List[Tuple[int, float]]:
+        scores = self.scores(query)
+        if not scores or k <= 0:
+            return []
+        rows = np.fromiter(scores, dtype=np.int64, count=len(scores))
+        values = np.fromiter(scores.values(), dtype=np.float32, count=len(scores))
+        if len(rows) > k:
+            keep = np.argpartition(-values, k - 1)[:k]
+            rows, values = rows[keep], values[keep]
+        order = np.argsort(-values, kind="stable")
+        return list(zip(rows[order].tolist(), values[order].tolist()))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "documents": len(self.documents),
+            "terms": len(self._postings),
+            "postings": sum(len(rows) for rows, _ in self._postings.values()),
+        }
+
+    def _term(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            postings = self._postings.get(term)
+            if postings is None:
+                return None
+            arrays = self._arrays[term] = (np.asarray(postings[0], dtype=np.int64), np.asarray(postings[1], dtype=np.float32))
+        return arrays
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[Document]], k: int, rrf_k: int = 60) -> List[Document]:
+    """Merges ranked lists by sum of 1 / (rrf_k + rank); a chunk in several lists counts once."""
+    scores: Dict[str, float] = {}
+    docs: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            cid = chunk_id(doc)
+            docs.setdefault(cid, doc)
+            scores[cid] = scores.get(cid, 0.0) + 1.0 / (rrf_k + rank + 1)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [docs[cid] for cid in best]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Args:
+        bm25: Keyword index over the same chunks as the vector store.
+        vectorstore: Dense side for "fusion"; source of the stored candidate vectors
+            and the fallback for "prefilter".
+        mode: "fusion" or "prefilter".
+        k: Chunks returned.
+        fetch_k: Chunks taken from each side before fusion.
+        candidates: BM25 candidates scored densely in "prefilter" mode.
+        rrf_k: Reciprocal-rank fusion constant.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    bm25: BM25Index
+    vectorstore: Any = None
+    mode: str = "fusion"
+    k: int = 4
+    fetch_k: int = 20
+    candidates: int = 100
+    rrf_k: int = 60
+
+    _counters: Dict[str, int] = PrivateAttr(
+        default_factory=lambda: {
+            "queries": 0, "fallbacks": 0, "dense_scored": 0, "bm25_candidates": 0, "missing_vectors": 0,
+        }
+    )
+    _faiss_positions: Optional[Dict[str, int]] = PrivateAttr(default=None)
+    _faiss_positions_key: Any = PrivateAttr(default=None)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        self._counters["queries"] += 1
+        if self.mode == "fusion":
+            return self._fusion(query)
+        if self.mode == "prefilter":
+            return self._prefilter(query)
+        raise ValueError(f"Unknown mode {self.mode!r}, expected 'fusion' or 'prefilter'")
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self._counters)
+        stats["dense_scored_per_query"] = stats["dense_scored"] / stats["queries"] if stats["queries"] else 0.0
+        return stats
+
+    def _fusion(self, query: str) -> List[Document]:
+        keyword = [doc for doc, _ in self.bm25.search(query, self.fetch_k)]
+        self._counters["bm25_candidates"] += len(keyword)
+        if self.vectorstore is None:
+            return keyword[:self.k]
+        dense = self.vectorstore.similarity_search(query, k=self.fetch_k)
+        self._counters["dense_scored"] += len(self.bm25)  # a full scan of the same chunks
+        return reciprocal_rank_fusion([keyword, dense], self.k, self.rrf_k)
+
+    def _prefilter(self, query: str) -> List[Document]:
+        top = self.bm25.top(query, self.candidates)
+        if not top:
+            if self.vectorstore is None:
+                return []
+            self._counters["fallbacks"] += 1
+            self._counters["dense_scored"] += len(self.bm25)
+            return self.vectorstore.similarity_search(query, k=self.k)
+
+        docs = [self.bm25.documents[row] for row, _ in top]
+        self._counters["bm25_candidates"] += len(docs)
+        if self.vectorstore is None:
+            return docs[:self.k]
+
+        q = np.asarray(self._query_embeddings().embed_query(query), dtype=np.float32)
+        q /= max(float(np.linalg.norm(q)), 1e-12)
+        ranked, scored = self._dense_top([self.bm25.ids[row] for row, _ in top], q)
+        self._counters["missing_vectors"] += len(docs) - scored
+        self._counters["dense_scored"] += scored
+        results = [docs[i] for i in ranked]
+        if len(results) < self.k:
+            # Too few keyword matches: top up from the full vector search
+            seen = {chunk_id(doc) for doc in results}
+            self._counters["dense_scored"] += len(self.bm25)
+            for doc in self.vectorstore.similarity_search(query, k=self.k + len(results)):
+                if len(results) < self.k and chunk_id(doc) not in seen:
+                    results.append(doc)
+        return results
+
+    def _query_embeddings(self) -> Any:
+        embeddings = getattr(self.vectorstore, "embeddings", None)
+        return embeddings if embeddings is not None else self.vectorstore.embedding_function
+
+    def _dense_top(self, ids: List[str], q: np.ndarray) -> Tuple[List[int], int]:
+        """
+        Scores the candidates with these chunk ids against the unit-length query q,
+        using the vectors already in the vector store. Returns the positions in ids
+        of the best k, best first, and how many candidates had a stored vector.
+        """
+        store = self.vectorstore
+        if hasattr(store, "search_rows"):
+            rows = store.rows_for_ids(ids)
+            found = np.flatnonzero(rows >= 0)
+            position = dict(zip(rows[found].tolist(), found.tolist()))
+            best, _ = store.search_rows(q, self.k, rows=rows[found])
+            return [position[row] for row in best.tolist()], len(found)
+
+        if not hasattr(store, "index_to_docstore_id"):
+            raise TypeError(f"prefilter mode cannot read stored vectors from {type(store).__name__}")
+        mapping = store.index_to_docstore_id
+        key = (id(mapping), len(mapping))
+        if self._faiss_positions is None or self._faiss_positions_key != key:
+            self._faiss_positions = {cid: pos for pos, cid in mapping.items()}
+            self._faiss_positions_key = key
+        positions = [self._faiss_positions.get(cid, -1) for cid in ids]
+        found = [i for i, pos in enumerate(positions) if pos >= 0]
+        if not found:
+            return [], 0
+        try:
+            vectors = store.index.reconstruct_batch(np.array([positions[i] for i in found], dtype=np.int64))
+        except RuntimeError as e:
+            raise TypeError("prefilter mode needs a flat FAISS index or an MmapVectorStore to read stored vectors") from e
+        vectors = np.asarray(vectors, dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        order = np.argsort(-(vectors @ q), kind="stable")[:self.k]
+        return [found[i] for i in order], len(found)
@@ -0,0 +1,184 @@
+"""
+Content-hash embedding cache for the RAG pipeline.
+
+Embedding chunks with a sentence-transformers model on CPU is the slowest part
+of building the index, and overlapping or re-ingested chunks are often embedded
+more than once. CachedEmbeddings wraps any LangChain embeddings object and keys
+every vector by sha256(model name, chunk text). Hits are read back from disk;
+misses are deduplicated, sorted by length and embedded in fixed-size batches
+(similar lengths mean less padding per batch), then appended to the cache.
+
+On disk, each model gets a directory with an append-only float32 matrix
+(vectors.f32), the matching 32-byte digests (keys.bin) and meta.json with the
+vector size. Opening the cache reads only the digests; vectors are memory-mapped.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+_UNSAFE = re.compile(r"[^\w.-]+")
+
+
+class EmbeddingStore:
+    """Append-only on-disk map from a 32-byte digest to a float32 vector."""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._keys_path = os.path.join(path, "keys.bin")
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._meta_path = os.path.join(path, "meta.json")
+        self._lock = threading.Lock()
+
+        self.dim: Optional[int] = None
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                self.dim = json.load(f)["dim"]
+        self._rows: Dict[bytes, int] = {}
+        self._vectors: Optional[np.memmap] = None
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get(self, digests: List[bytes]) -> Dict[bytes, np.ndarray]:
+        with self._lock:
+            if self._vectors is None:
+                return {}
+            return {d: np.array(self._vectors[self._rows[d]]) for d in digests if d in self._rows}
+
+    def put(self, digests: List[bytes], vectors: np.ndarray) -> None:
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                with open(self._meta_path, "w") as f:
+                    json.dump({"dim": self.dim}, f)
+            fresh = [i for i, d in enumerate(digests) if d not in self._rows]
+            if not fresh:
+                return
+            self._truncate(len(self._rows))
+            with open(self._vectors_path, "ab") as f:
+                vectors[fresh].tofile(f)
+            with open(self._keys_path, "ab") as f:
+                f.write(b"".join(digests[i] for i in fresh))
+            for i in fresh:
+                self._rows[digests[i]] = len(self._rows)
+            self._map()
+
+    def _load(self) -> None:
+        if self.dim is None or not os.path.exists(self._keys_path) or not os.path.exists(self._vectors_path):
+            return
+        keys = np.fromfile(self._keys_path, dtype="S32")
+        rows = min(len(keys), os.path.getsize(self._vectors_path) // (4 * self.dim))
+        # Rows beyond the shorter file come from an interrupted append
+        self._rows = {bytes(k): i for i, k in enumerate(keys[:rows])}
+        self._map()
+
+    def _map(self) -> None:
+        rows = len(self._rows)
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim)) if rows else None
+
+    def _truncate(self, rows: int) -> None:
+        for path, size in ((self._keys_path, 32 * rows), (self._vectors_path, 4 * self.dim * rows)):
+            if os.path.exists(path) and os.path.getsize(path) != size:
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+
+
+class CachedEmbeddings(Embeddings):
+    def __init__(
+        self,
+        embeddings: Any,
+        cache_dir: str,
+        model_name: Optional[str] = None,
+        batch_size: int = 64,
+        workers: int = 1,
+    ):
+        """
+        Args:
+            embeddings: LangChain embeddings that do the actual work (e.g. HuggingFaceEmbeddings).
+            cache_dir: Directory for the cache; each model gets its own subdirectory.
+            model_name: Part of the cache key. Defaults to embeddings.model_name.
+            batch_size: Chunks per embed_documents call on a cache miss.
+            workers: Batches embedded at once. Torch already spreads one batch over all
+                cores, so raise this only for embedders that run on a single thread.
+        """
+        self.embeddings = embeddings
+        self.model_name = model_name or getattr(embeddings, "model_name", None) or type(embeddings).__name__
+        self.batch_size = batch_size
+        self.workers = workers
+        self.store = EmbeddingStore(os.path.join(cache_dir, _UNSAFE.sub("_", self.model_name)))
+        self._counters = {"hits": 0, "misses": 0, "embedded": 0, "embed_seconds": 0.0}
+        self.last_run: Dict[str, Any] = {}
+
+    def key(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).digest()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        digests = [self.key(t) for t in texts]
+        found = self.store.get(digests)
+        hits = sum(d in found for d in digests)
+
+        # Each distinct missing text is embedded once
+        missing: Dict[bytes, str] = {}
+        for digest, text in zip(digests, texts):
+            if digest not in found:
+                missing.setdefault(digest, text)
+
+        started = time.perf_counter()
+        if missing:
+            keys = list(missing)
+            vectors = self._embed_batched([missing[k] for k in keys])
+            self.store.put(keys, vectors)
+            found.update(zip(keys, vectors))
+        seconds = time.perf_counter() - started
+
+        self._counters["hits"] += hits
+        self._counters["misses"] += len(texts) - hits
+        self._counters["embedded"] += len(missing)
+        self._counters["embed_seconds"] += seconds
+        self.last_run = {
+            "chunks": len(texts),
+            "cache_hits": hits,
+            "embedded": len(missing),
+            "seconds": round(seconds, 3),
+            "chunks_per_s": round(len(missing) / seconds, 1) if missing and seconds else None,
+        }
+        return [found[d].tolist() for d in digests]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self._counters)
+        stats["entries"] = len(self.store)
+        stats["chunks_per_s"] = round(stats["embedded"] / stats["embed_seconds"], 1) if stats["embed_seconds"] else None
+        return stats
+
+    def _embed_batched(self, texts: List[str]) -> np.ndarray:
+        """Sorts by length, embeds in fixed-size batches and restores the input order."""
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        batches = [order[i:i + self.batch_size] for i in range(0, len(order), self.batch_size)]
+
+        def embed(batch: List[int]) -> np.ndarray:
+            return np.asarray(self.embeddings.embed_documents([texts[i] for i in batch]), dtype=np.float32)
+
+        if self.workers > 1 and len(batches) > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                results = list(pool.map(embed, batches))
+        else:
+            results = [embed(batch) for batch in batches]
+
+        out = np.empty((len(texts), results[0].shape[1]), dtype=np.float32)
+        for batch, vectors in zip(batches, results):
+            out[batch] = vectors
+        return out
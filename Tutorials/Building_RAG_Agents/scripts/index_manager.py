@@ -0,0 +1,183 @@
+"""
+Persistent, incrementally updated vector index for the RAG pipeline.
+
+FAISS.from_documents re-embeds the whole corpus on every run. IndexManager keeps
+the FAISS index on disk together with a manifest of chunk content hashes per
+source, and sync() only embeds chunks whose hash is not indexed yet. Chunks
+that disappeared from a source are deleted from the index (and counted as
+tombstones in the manifest), and a source whose chunks are unchanged costs a
+hash comparison. Opening an existing index just loads it from disk.
+
+Chunk ids are content hashes, so the FAISS docstore itself is the source of
+truth: on load the manifest is reconciled with the ids actually in the index,
+which makes an interrupted save harmless.
+"""
+import hashlib
+import json
+import os
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+MANIFEST = "manifest.json"
+
+
+def chunk_id(doc: Document) -> str:
+    """Content hash of a chunk: its text plus metadata (source, page, ...)."""
+    material = json.dumps(doc.metadata, sort_keys=True, default=str) + "\0" + doc.page_content
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def source_of(doc: Document) -> str:
+    return str(doc.metadata.get("source", ""))
+
+
+class IndexManager:
+    def __init__(
+        self,
+        path: str,
+        embedding_function: Any,
+        embed_documents: Optional[Callable[[List[str]], List[List[float]]]] = None,
+    ):
+        """
+        Args:
+            path: Directory holding the FAISS index and the manifest.
+            embedding_function: LangChain embeddings, used for queries and, by default, for chunks.
+            embed_documents: Optional replacement for embedding_function.embed_documents (e.g. a cached pipeline).
+        """
+        self.path = path
+        self.embedding_function = embedding_function
+        self.embed_documents = embed_documents or embedding_function.embed_documents
+        self.vectorstore: Optional[FAISS] = None
+        self.manifest: Dict[str, Any] = {"sources": {}, "tombstones": 0}
+        self.load_seconds = 0.0
+        self._load()
+
+    # -----------------------------
+    # Public API
+    # -----------------------------
+    def sync(self, documents: Iterable[Document], prune: bool = False) -> Dict[str, Any]:
+        """
+        Brings the index in line with documents (already split into chunks).
+        Only the sources present in documents are updated; with prune=True,
+        sources missing from documents are removed from the index too.
+        """
+        started = time.perf_counter()
+        by_source: Dict[str, Dict[str, Document]] = defaultdict(dict)
+        for doc in documents:
+            by_source[source_of(doc)][chunk_id(doc)] = doc
+
+        sources = self.manifest["sources"]
+        to_add: Dict[str, Document] = {}
+        to_delete: List[str] = []
+        unchanged = 0
+        for source, chunks in by_source.items():
+            digest = self._source_digest(chunks)
+            entry = sources.get(source)
+            if entry is not None and entry["digest"] == digest:
+                unchanged += len(chunks)
+                continue
+            known = set(entry["chunks"]) if entry else set()
+            to_add.update((cid, doc) for cid, doc in chunks.items() if cid not in known)
+            to_delete.extend(known - chunks.keys())
+            unchanged += len(known & chunks.keys())
+        removed_sources = [s for s in sources if s not in by_source] if prune else []
+        for source in removed_sources:
+            to_delete.extend(sources[source]["chunks"])
+
+        if to_delete and self.vectorstore is not None:
+            self.vectorstore.delete(to_delete)
+            self.manifest["tombstones"] += len(to_delete)
+        if to_add:
+            self._add(to_add)
+
+        for source, chunks in by_source.items():
+            sources[source] = {"digest": self._source_digest(chunks), "chunks": sorted(chunks)}
+        for source in removed_sources:
+            del sources[source]
+        if to_add or to_delete:
+            self.save()
+
+        return {
+            "added": len(to_add),
+            "removed": len(to_delete),
+            "unchanged": unchanged,
+            "sources": len(sources),
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+
+    def as_retriever(self, **kwargs: Any):
+        if self.vectorstore is None:
+            raise ValueError("The index is empty; call sync() with some documents first.")
+        return self.vectorstore.as_retriever(**kwargs)
+
+    def save(self) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        if self.vectorstore is not None:
+            self.vectorstore.save_local(self.path)
+        # Manifest last; _load reconciles it with the index if a save was interrupted
+        tmp = os.path.join(self.path, MANIFEST + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp, os.path.join(self.path, MANIFEST))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "chunks": len(self.vectorstore.index_to_docstore_id) if self.vectorstore is not None else 0,
+            "sources": len(self.manifest["sources"]),
+            "tombstones": self.manifest["tombstones"],
+            "load_seconds": round(self.load_seconds, 4),
+        }
+
+    # -----------------------------
+    # Internals
+    # -----------------------------
+    @staticmethod
+    def _source_digest(chunks: Dict[str, Document]) -> str:
+        return hashlib.sha256("".join(sorted(chunks)).encode("ascii")).hexdigest()
+
+    def _add(self, docs: Dict[str, Document]) -> None:
+        ids = list(docs)
+        texts = [docs[i].page_content for i in ids]
+        embeddings = self.embed_documents(texts)
+        pairs = list(zip(texts, embeddings))
+        metadatas = [docs[i].metadata for i in ids]
+        if self.vectorstore is None:
+            self.vectorstore = FAISS.from_embeddings(pairs, self.embedding_function, metadatas=metadatas, ids=ids)
+        else:
+            self.vectorstore.add_embeddings(pairs, metadatas=metadatas, ids=ids)
+
+    def _load(self) -> None:
+        if not os.path.exists(os.path.join(self.path, "index.faiss")):
+            return
+        started = time.perf_counter()
+        # The index was written by this class, so unpickling the docstore is safe
+        self.vectorstore = FAISS.load_local(self.path, self.embedding_function, allow_dangerous_deserialization=True)
+        manifest_path = os.path.join(self.path, MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                self.manifest = json.load(f)
+        self._reconcile()
+        self.load_seconds = time.perf_counter() - started
+
+    def _reconcile(self) -> None:
+        """Makes the manifest match the ids actually stored in the index."""
+        present = set(self.vectorstore.index_to_docstore_id.values())
+        listed = set()
+        sources = self.manifest["sources"]
+        for source, entry in list(sources.items()):
+            chunks = [cid for cid in entry["chunks"] if cid in present]
+            listed.update(chunks)
+            if len(chunks) != len(entry["chunks"]):
+                entry["chunks"], entry["digest"] = chunks, ""  # forces a re-check on the next sync
+            if not chunks:
+                del sources[source]
+        for cid in present - listed:
+            doc = self.vectorstore.docstore.search(cid)
+            source = source_of(doc) if isinstance(doc, Document) else ""
+            entry = sources.setdefault(source, {"digest": "", "chunks": []})
+            entry["chunks"].append(cid)
+            entry["digest"] = ""
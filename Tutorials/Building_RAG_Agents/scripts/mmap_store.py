@@ -0,0 +1,237 @@
+"""
+Memory-mapped NumPy vector store for small and medium RAG corpora.
+
+A directory holds three files:
+
+- vectors.npy: unit-length float32 embeddings, one row per chunk
+- docs.jsonl: one {"id", "page_content", "metadata"} object per line
+- offsets.npy: byte offset of every line in docs.jsonl
+
+add_texts appends to docs.jsonl, then rewrites vectors.npy and finally
+offsets.npy, which commits the new rows: a store interrupted mid-write opens
+with the rows listed in offsets.npy, and the next add_texts cuts the uncommitted
+tail off docs.jsonl, so line i of docs.jsonl is always row i.
+
+Opening the store only memory-maps vectors.npy and offsets.npy; nothing is
+unpickled, and worker processes on the same machine share the page cache
+instead of each holding a copy. A query is a single matrix-vector product
+(exact cosine similarity) followed by argpartition for the top k, and only
+those k documents are read from docs.jsonl.
+
+MmapVectorStore is a LangChain VectorStore, so as_retriever() works as with FAISS.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+VECTORS = "vectors.npy"
+DOCS = "docs.jsonl"
+OFFSETS = "offsets.npy"
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class MmapVectorStore(VectorStore):
+    def __init__(self, path: str, embedding: Embeddings):
+        """
+        Args:
+            path: Directory holding the store. An existing store is opened, otherwise
+                it is created on the first add_texts.
+            embedding: LangChain embeddings used for queries and added texts.
+        """
+        self.path = path
+        self.embedding = embedding
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None
+        self._offsets: Optional[np.ndarray] = None
+        self._id_rows: Optional[Dict[str, int]] = None  # built on first rows_for_ids
+        self.load_seconds = 0.0
+        self._open()
+
+    @classmethod
+    def load(cls, path: str, embedding: Embeddings) -> "MmapVectorStore":
+        if not os.path.exists(os.path.join(path, VECTORS)):
+            raise FileNotFoundError(f"No vector store in {path}")
+        return cls(path, embedding)
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def __len__(self) -> int:
+        return 0 if self._vectors is None else len(self._vectors)
+
+    # -----------------------------
+    # Building
+    # -----------------------------
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        *,
+        ids: Optional[List[str]] = None,
+        path: str = "mmap_index",
+        **kwargs: Any,
+    ) -> "MmapVectorStore":
+        store = cls(path, embedding)
+        store.add_texts(texts, metadatas, ids=ids)
+        return store
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        *,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        """
+        Embeds and appends texts. vectors.npy is rewritten (its header holds the
+        row count), which is fine at the corpus sizes this store is meant for.
+        """
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        if not texts:
+            return []
+        vectors = _normalize(self.embedding.embed_documents(texts))
+
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            docs_path = os.path.join(self.path, DOCS)
+            start = self._docs_end()
+            if os.path.exists(docs_path) and os.path.getsize(docs_path) > start:
+                # Lines of an interrupted add_texts, never committed to offsets.npy
+                os.truncate(docs_path, start)
+            lines = [
+                json.dumps({"id": i, "page_content": t, "metadata": m}, ensure_ascii=False, default=str).encode("utf-8") + b"\n"
+                for i, t, m in zip(ids, texts, metadatas)
+            ]
+            offsets = start + np.cumsum([0] + [len(line) for line in lines[:-1]], dtype=np.int64)
+            with open(docs_path, "ab") as f:
+                f.writelines(lines)
+
+            old = 0 if self._vectors is None else len(self._vectors)
+            # offsets.npy last: it is what commits the new rows
+            self._rewrite(VECTORS, self._vectors, vectors, (old + len(vectors), vectors.shape[1]), np.float32)
+            self._rewrite(OFFSETS, self._offsets, offsets, (old + len(offsets),), np.int64)
+            self._open()
+            self._id_rows = None
+        return ids
+
+    def _rewrite(self, name: str, current: Optional[np.ndarray], new: np.ndarray, shape: Tuple[int, ...], dtype: Any) -> None:
+        """Writes current + new to a temporary .npy and swaps it in."""
+        tmp = os.path.join(self.path, name + ".tmp")
+        out = np.lib.format.open_memmap(tmp, mode="w+", dtype=dtype, shape=shape)
+        old = 0 if current is None else len(current)
+        if old:
+            out[:old] = current
+        out[old:] = new
+        out.flush()
+        del out
+        os.replace(tmp, os.path.join(self.path, name))
+
+    def _docs_end(self) -> int:
+        """Byte size of the committed lines of docs.jsonl."""
+        if not len(self):
+            return 0
+        with open(os.path.join(self.path, DOCS), "rb") as f:
+            f.seek(int(self._offsets[-1]))
+            return f.tell() + len(f.readline())
+
+    def _open(self) -> None:
+        vectors_path = os.path.join(self.path, VECTORS)
+        if not os.path.exists(vectors_path):
+            return
+        started = time.perf_counter()
+        vectors = np.load(vectors_path, mmap_mode="r")
+        offsets_path = os.path.join(self.path, OFFSETS)
+        offsets = np.load(offsets_path, mmap_mode="r") if os.path.exists(offsets_path) else np.empty(0, dtype=np.int64)
+        # Only rows listed in offsets.npy are committed
+        rows = min(len(vectors), len(offsets))
+        self._vectors, self._offsets = vectors[:rows], offsets[:rows]
+        self.load_seconds = time.perf_counter() - started
+
+    # -----------------------------
+    # Search
+    # -----------------------------
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self.embedding.embed_query(query), k)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k)]
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4) -> List[Tuple[Document, float]]:
+        rows, scores = self.search_rows(_normalize(embedding), k)
+        return [(self.get_document(row), float(score)) for row, score in zip(rows, scores)]
+
+    def search_rows(self, query: np.ndarray, k: int, rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Exact top-k by cosine similarity for a unit-length query. With rows, only
+        those rows are scored. Returns (row indices, scores), best first.
+        """
+        vectors = self._vectors
+        empty = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if vectors is None:
+            return empty
+        if rows is not None:
+            rows = np.asarray(rows, dtype=np.int64)
+            scores = vectors[rows] @ query
+        else:
+            scores = vectors @ query
+        k = min(k, len(scores))
+        if k <= 0:
+            return empty
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return (rows[top] if rows is not None else top), scores[top]
+
+    def rows_for_ids(self, ids: List[str]) -> np.ndarray:
+        """Row of each document id, -1 for unknown ids. The first call reads the ids from docs.jsonl."""
+        if self._id_rows is None:
+            id_rows: Dict[str, int] = {}
+            docs_path = os.path.join(self.path, DOCS)
+            if self._vectors is not None:
+                with open(docs_path, "rb") as f:
+                    for row, line in enumerate(f):
+                        if row >= len(self._vectors):
+                            break
+                        id_rows[json.loads(line)["id"]] = row
+            self._id_rows = id_rows
+        return np.fromiter((self._id_rows.get(i, -1) for i in ids), dtype=np.int64, count=len(ids))
+
+    def get_document(self, row: int) -> Document:
+        with open(os.path.join(self.path, DOCS), "rb") as f:
+            f.seek(int(self._offsets[row]))
+            record = json.loads(f.readline())
+        return Document(id=record["id"], page_content=record["page_content"], metadata=record["metadata"])
+
+    def stats(self) -> Dict[str, Any]:
+        vectors = self._vectors
+        return {
+            "chunks": len(self),
+            "dim": int(vectors.shape[1]) if vectors is not None else None,
+            "vector_bytes": int(vectors.nbytes) if vectors is not None else 0,
+            "load_seconds": round(self.load_seconds, 4),
+        }
+
+    def _select_relevance_score_fn(self):
+        # Cosine similarity in [-1, 1] -> relevance in [0, 1]
+        return lambda score: (score + 1.0) / 2.0
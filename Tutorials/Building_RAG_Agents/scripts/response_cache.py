@@ -0,0 +1,205 @@
+"""
+Exact-match response cache for the Spin wrappers.
+
+Identical requests (same model, rendered prompt, tool preamble and generation
+parameters) are answered from a two tier cache instead of going over the network:
+an in-memory LRU in front of an optional on-disk SQLite store. Entries expire
+after ttl seconds, and the disk tier is trimmed, least recently used first, to
+max_disk_bytes. Memory hits also count as uses of the disk row; their access
+times are written in batches. get() and put() block on SQLite, so async callers
+run them on a worker thread. Sampled responses (temperature > 0) are not cached
+unless cache_sampled is set, since a retry would normally expect a different
+answer.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_entries: int = 1024,
+        ttl: Optional[float] = 24 * 3600,
+        max_disk_bytes: int = 64 * 1024 * 1024,
+        cache_sampled: bool = False,
+        trim_every: int = 64,
+    ):
+        """
+        Args:
+            path: SQLite file for the persistent tier, or None for memory only.
+            max_entries: Size of the in-memory LRU tier.
+            ttl: Seconds an entry stays valid, or None to keep entries until evicted.
+            max_disk_bytes: Upper bound on the total size of cached responses on disk.
+            cache_sampled: Also cache requests with temperature > 0.
+            trim_every: Run disk expiry and size eviction every this many writes, and
+                write access times of memory hits to disk every this many hits.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_bytes = max_disk_bytes
+        self.cache_sampled = cache_sampled
+        self.trim_every = trim_every
+
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._touched: Dict[str, float] = {}  # memory hits whose disk access time is not written yet
+        self._counters = {
+            "memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "skipped": 0,
+            "memory_evictions": 0, "disk_evictions": 0,
+        }
+
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+            self._db.commit()
+
+    # -----------------------------
+    # Keys
+    # -----------------------------
+    @staticmethod
+    def make_key(model_name: str, prompt: str, preamble: str = "", params: Optional[Dict[str, Any]] = None) -> str:
+        material = json.dumps([model_name, preamble, prompt, params or {}], sort_keys=True, default=str)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def should_cache(self, params: Optional[Dict[str, Any]]) -> bool:
+        temperature = (params or {}).get("temperature") or 0
+        if temperature > 0 and not self.cache_sampled:
+            with self._lock:
+                self._counters["skipped"] += 1
+            return False
+        return True
+
+    # -----------------------------
+    # Lookup / store
+    # -----------------------------
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created = entry
+                if self._fresh(created, now):
+                    self._memory.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    if self._db is not None:
+                        self._touched[key] = now
+                        if len(self._touched) >= self.trim_every:
+                            self._flush_touched()
+                    return value
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None and self._fresh(row[1], now):
+                    self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                    self._db.commit()
+                    self._remember(key, row[0], row[1])
+                    self._counters["disk_hits"] += 1
+                    return row[0]
+
+            self._counters["misses"] += 1
+            return None
+
+    def put(self, key: str, value: str) -> None:
+        if not value:
+            return
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            self._counters["writes"] += 1
+            if self._db is None:
+                return
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self._db.commit()
+            self._writes += 1
+            if self._writes % self.trim_every == 0:
+                self._trim_disk(now)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._touched.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["hits"] = stats["memory_hits"] + stats["disk_hits"]
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+            stats["memory_entries"] = len(self._memory)
+            if self._db is not None:
+                count, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM responses").fetchone()
+                stats["disk_entries"] = count
+                stats["disk_bytes"] = size
+            return stats
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._flush_touched()
+                self._db.close()
+                self._db = None
+
+    # -----------------------------
+    # Internals (callers hold self._lock)
+    # -----------------------------
+    def _fresh(self, created: float, now: float) -> bool:
+        return self.ttl is None or now - created <= self.ttl
+
+    def _remember(self, key: str, value: str, created: float) -> None:
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._counters["memory_evictions"] += 1
+
+    def _flush_touched(self) -> None:
+        if self._touched:
+            self._db.executemany(
+                "UPDATE responses SET accessed = MAX(accessed, ?) WHERE key = ?",
+                [(accessed, key) for key, accessed in self._touched.items()],
+            )
+            self._db.commit()
+            self._touched.clear()
+
+    def _trim_disk(self, now: float) -> None:
+        # Memory hits first, so hot entries are not evicted as if unused
+        self._flush_touched()
+        if self.ttl is not None:
+            cursor = self._db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+            self._counters["disk_evictions"] += cursor.rowcount
+        total = self._db.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM responses").fetchone()[0]
+        while total > self.max_disk_bytes:
+            rows = self._db.execute(
+                "SELECT key, LENGTH(value) FROM responses ORDER BY accessed LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+            victims = []
+            for key, size in rows:
+                if total <= self.max_disk_bytes:
+                    break
+                victims.append((key,))
+                total -= size
+            self._db.executemany("DELETE FROM responses WHERE key = ?", victims)
+            self._counters["disk_evictions"] += len(victims)
+        self._db.commit()
@@ -0,0 +1,142 @@
+"""
+Semantic response cache for SpinLLM.
+
+Incoming queries are embedded with the same embedding function used to build the
+vector store (e.g. HuggingFaceEmbeddings), and compared against the queries that
+were already answered. If the closest one is above a cosine similarity threshold,
+its answer is returned without calling the host. Embeddings live in a fixed size
+float32 NumPy matrix, so a lookup is a single matrix-vector product. An entry
+only matches lookups with the same context (e.g. model and generation limits).
+When the cache is full, an expired entry is overwritten if there is one,
+otherwise the least recently used.
+"""
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+_QUESTION = re.compile(r"Question:\s*(.*?)\s*(?:\n|Context:|$)", re.DOTALL)
+
+
+def extract_question(prompt: str) -> str:
+    """
+    Pulls the user question out of a rendered RAG prompt (such as the rlm/rag-prompt
+    template, "Question: ... Context: ... Answer:"), so the retrieved context does not
+    dilute the similarity. Prompts without a Question: line are used as they are.
+    """
+    match = _QUESTION.search(prompt)
+    return match.group(1) if match and match.group(1) else prompt
+
+
+class SemanticCache:
+    def __init__(
+        self,
+        embedding_function: Any,
+        threshold: float = 0.92,
+        capacity: int = 2048,
+        ttl: Optional[float] = None,
+        query_extractor: Optional[Callable[[str], str]] = extract_question,
+    ):
+        """
+        Args:
+            embedding_function: Object with embed_query(text) -> list of floats.
+            threshold: Minimum cosine similarity for a hit.
+            capacity: Maximum number of cached queries.
+            ttl: Seconds an entry stays valid, or None for no expiry.
+            query_extractor: Maps a prompt to the text that is embedded, or None to use the whole prompt.
+        """
+        self.embedding_function = embedding_function
+        self.threshold = threshold
+        self.capacity = capacity
+        self.ttl = ttl
+        self.query_extractor = query_extractor
+
+        self._vectors: Optional[np.ndarray] = None  # (capacity, dim), rows are unit length
+        self._created = np.zeros(capacity, dtype=np.float64)
+        self._last_used = np.zeros(capacity, dtype=np.float64)
+        self._context_ids = np.zeros(capacity, dtype=np.int64)
+        self._context_index: Dict[Hashable, int] = {}
+        self._answers: List[Optional[str]] = [None] * capacity
+        self._queries: List[Optional[str]] = [None] * capacity
+        self._size = 0
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    def query_text(self, prompt: str) -> str:
+        return self.query_extractor(prompt) if self.query_extractor else prompt
+
+    def embed(self, prompt: str) -> np.ndarray:
+        vector = np.asarray(self.embedding_function.embed_query(self.query_text(prompt)), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(
+        self, prompt: str, vector: Optional[np.ndarray] = None, context: Hashable = None
+    ) -> Tuple[Optional[str], np.ndarray]:
+        """
+        Returns (cached answer or None, query embedding). Only entries added with an
+        equal context can match. Pass the embedding back to add() on a miss so the
+        query is not embedded twice.
+        """
+        if vector is None:
+            vector = self.embed(prompt)
+        now = time.time()
+        with self._lock:
+            context_id = self._context_index.get(context)
+            if self._size and context_id is not None:
+                scores = self._vectors[:self._size] @ vector
+                scores[self._context_ids[:self._size] != context_id] = -np.inf
+                if self.ttl is not None:
+                    scores[now - self._created[:self._size] > self.ttl] = -np.inf
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self._last_used[best] = now
+                    self._counters["hits"] += 1
+                    return self._answers[best], vector
+            self._counters["misses"] += 1
+        return None, vector
+
+    def add(self, prompt: str, answer: str, vector: Optional[np.ndarray] = None, context: Hashable = None) -> None:
+        if not answer:
+            return
+        if vector is None:
+            vector = self.embed(prompt)
+        now = time.time()
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+            if self._size < self.capacity:
+                slot = self._size
+                self._size += 1
+            else:
+                expired = np.flatnonzero(now - self._created > self.ttl) if self.ttl is not None else []
+                slot = int(expired[0]) if len(expired) else int(np.argmin(self._last_used))
+                self._counters["evictions"] += 1
+            self._vectors[slot] = vector
+            self._created[slot] = now
+            self._last_used[slot] = now
+            self._context_ids[slot] = self._context_index.setdefault(context, len(self._context_index))
+            self._answers[slot] = answer
+            self._queries[slot] = self.query_text(prompt)
+            self._counters["writes"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._answers = [None] * self.capacity
+            self._queries = [None] * self.capacity
+            self._created[:] = 0
+            self._last_used[:] = 0
+            self._context_ids[:] = 0
+            self._context_index.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._counters)
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+            stats["entries"] = self._size
+            stats["capacity"] = self.capacity
+            return stats
@@ -1,5 +1,4 @@
 import streamlit as st
-import yfinance as yf
 from bs4 import BeautifulSoup
 import requests
 import re
@@ -9,58 +8,11 @@ from langchain_core.prompts import ChatPromptTemplate
 from langchain.agents import create_agent
 from typing import Dict, List, Any
 from SpinLLM import SpinChatModel
-
-def clean_and_format_output(text: str) -> str:
-    
-    if not text:
-        return "No output generated."
-
-    # ----------- Basic text cleanup -----------
-    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", text)       # Fix merged words: NetIncomewas → Net Income was
-    text = re.sub(r"([0-9])([A-Za-z])", r"\1 \2", text)    # 281.72billion → 281.72 billion
-    text = re.sub(r"([A-Za-z])([0-9])", r"\1 \2", text)
-    text = re.sub(r"\s+", " ", text).strip()               # Normalize spaces
-
-    # Detect financial section
-    financial_keywords = ["revenue", "net income", "operating income", "financial"]
-    is_financial = any(k in text.lower() for k in financial_keywords)
-
-    # --- If not financial, return raw cleaned text ---
-    if not is_financial:
-        return f"### 📝 Summary\n• {text}"
-
-    # --- Extract values using regex ---
-    # Example match: "Revenue was 281.72 billion"
-    pattern = r"(Revenue|Net Income|Operating Income)[^\d]*([\d.,]+)\s*billion"
-    matches = re.findall(pattern, text, flags=re.IGNORECASE)
-
-    # Build dictionary: {"Revenue": [198.27, 281.72], ...}
-    metrics_dict = {}
-
-    for label, value in matches:
-        label = label.title()
-        value = float(value.replace(",", ""))
-        metrics_dict.setdefault(label, []).append(value)
-        
-    # If no metrics detected → fallback
-    if not metrics_dict:
-        return f"### 📈 Financial Metrics\n• {text}"
-    
-    # ----------- Generate narrative bullet points -----------
-    bullets = []
-
-    for metric, values in metrics_dict.items():
-        if len(values) >= 2:
-            start_val = values[0]
-            end_val = values[-1]
-            bullets.append(
-                f"• {metric} increased from {start_val} billion to {end_val} billion."
-            )
-        else:
-            bullets.append(f"• {metric}: {values[0]} billion.")
-    
-    # ----------- Return formatted output -----------
-    return "### 📈 Financial Metrics\n" + "\n".join(bullets)
+from tool_output import ToolOutputLimiter, ToolOutputPolicy
+from ticker_cache import TickerDataCache
+from price_store import PriceHistoryStore, compute_indicators
+from formatting import clean_and_format_output
+from tool_executor import ToolExecutor, ToolLimits
 
 #Initialize SpiLLI
 @st.cache_resource
@@ -69,23 +21,42 @@ def load_model():
        model_name="llama3-groq-tool-use:8b",
        encryption_path='./SpiLLI.pem',
        temperature=0.8,
-       max_tokens=512
+       max_tokens=512,
+       # Financial tables go in as compact JSON, long business summaries are cut
+       tool_output_limiter=ToolOutputLimiter(
+           policies={
+               "get_stock_financials": ToolOutputPolicy(max_chars=2000),
+               "get_company_profile": ToolOutputPolicy(max_chars=1200, strategy="head"),
+           },
+       ),
     )
     return llm
 
+# Shared by all tools: quotes are refetched after a minute, profiles and
+# financials after a day, and concurrent lookups of a ticker share one request.
+# At most 4 Yahoo requests run at once, including the per-ticker fan-out of
+# the compare tools. Pass TickerDataCache(LocalSource({...})) to run without
+# network access.
+ticker_cache = TickerDataCache(max_concurrent_fetches=4)
+# Daily price history on disk, only the missing days are downloaded
+price_store = PriceHistoryStore("./price_history")
+
+# Tools run off the agent thread with a timeout, at most 4 tool calls at once.
+# A timed-out call keeps running in the background, but its fetches still hold
+# ticker_cache slots, so the request cap above holds
+tool_executor = ToolExecutor(default=ToolLimits(timeout=20.0, max_concurrency=4, pool="yfinance"))
+
 #Custom tools for the agent
-def _get_info_from_yf(ticker: str) -> dict:
+def _get_info_from_yf(ticker: str, field: str = "quote") -> dict:
     """Helper to safely fetch info from yfinance."""
-    ticker = ticker.strip().upper()
-    stock = yf.Ticker(ticker)
     try:
-        return stock.info or {}
+        return ticker_cache.get(ticker, field) or {}
     except Exception:
         return {}
 
 def get_stock_price_fn(ticker: str) -> dict[str, Any]:
     """Returns live stock price, previous close, volume, and 52-week data."""
-    info = _get_info_from_yf(ticker)
+    info = _get_info_from_yf(ticker, "quote")
     return {
         "ticker": ticker,
         "currentPrice": info.get("currentPrice"),
@@ -101,10 +72,8 @@ def get_stock_price_fn(ticker: str) -> dict[str, Any]:
 
 def get_stock_financials_fn(ticker: str) -> dict[str, Any]:
     """Returns revenue, net income, and operating income."""
-    ticker = ticker.strip().upper()
-    stock = yf.Ticker(ticker)
     try:
-        financials = stock.financials
+        financials = ticker_cache.financials(ticker)
         return{
             "Revenue": financials.loc["Total Revenue"].to_dict() if "Total Revenue" in financials.index else{},
             "Net Income": financials.loc["Net Income"].to_dict() if "Net Income" in financials.index else{},
@@ -115,7 +84,7 @@ def get_stock_financials_fn(ticker: str) -> dict[str, Any]:
 
 def get_company_profile_fn(ticker: str) -> dict[str, Any]:
     """Returns company name, sector, industry, website, and business summary."""
-    info = _get_info_from_yf(ticker)
+    info = _get_info_from_yf(ticker, "profile")
     return {
         "ticker": ticker.strip().upper(),
         "name": info.get("longName"),
@@ -125,6 +94,85 @@ def get_company_profile_fn(ticker: str) -> dict[str, Any]:
         "summary": info.get("longBusinessSummary"),
     }
 
+def get_price_indicators_fn(ticker: str) -> dict[str, Any]:
+    """Returns trend indicators from daily price history: returns, moving averages, volatility and drawdowns."""
+    ticker = ticker.strip().upper()
+    try:
+        indicators = compute_indicators(price_store.history(ticker))
+    except Exception:
+        return {"ticker": ticker, "error": "Unable to fetch price history."}
+    return {"ticker": ticker, **indicators}
+
+# ----------------------------------
+# Multi-ticker tools for comparisons
+# ----------------------------------
+_TICKER = re.compile(r"[A-Za-z][A-Za-z0-9.\-]{0,9}")
+_NOT_TICKERS = {"VS", "AND", "OR", "VERSUS"}
+
+def _parse_tickers(tickers: str) -> List[str]:
+    """Reads tickers from 'AMD, INTC', 'AMD INTC' or 'AMD vs INTC'."""
+    found = [t.upper() for t in _TICKER.findall(tickers)]
+    return list(dict.fromkeys(t for t in found if t not in _NOT_TICKERS))
+
+def _format_number(value: Any) -> str:
+    if value is None or (isinstance(value, float) and value != value):
+        return "-"
+    if isinstance(value, (int, float)):
+        for limit, suffix in ((1e12, "T"), (1e9, "B"), (1e6, "M")):
+            if abs(value) >= limit:
+                return f"{value / limit:.2f}{suffix}"
+        return f"{value:g}" if isinstance(value, float) else str(value)
+    return str(value)
+
+def _table(columns: List[str], rows: List[List[Any]]) -> str:
+    """Compact pipe-separated table, one line per ticker."""
+    lines = [" | ".join(columns)]
+    lines += [" | ".join(_format_number(v) for v in row) for row in rows]
+    return "\n".join(lines)
+
+def _error_row(ticker: str, width: int) -> List[Any]:
+    return [ticker, "unavailable"] + ["-"] * (width - 2)
+
+def compare_stock_prices_fn(tickers: str) -> str:
+    """Returns current price, previous close, day range, volume, market cap and 52-week range for several tickers."""
+    columns = ["ticker", "price", "prevClose", "dayLow", "dayHigh", "volume", "marketCap", "52wLow", "52wHigh"]
+    rows = []
+    for ticker, info in ticker_cache.get_many(_parse_tickers(tickers), "quote").items():
+        if isinstance(info, Exception) or not info:
+            rows.append(_error_row(ticker, len(columns)))
+            continue
+        rows.append([
+            ticker, info.get("currentPrice"), info.get("previousClose"), info.get("dayLow"), info.get("dayHigh"),
+            info.get("volume"), info.get("marketCap"), info.get("fiftyTwoWeekLow"), info.get("fiftyTwoWeekHigh"),
+        ])
+    return _table(columns, rows)
+
+def compare_stock_financials_fn(tickers: str) -> str:
+    """Returns the latest fiscal year revenue, net income and operating income for several tickers."""
+    columns = ["ticker", "fiscalYear", "revenue", "netIncome", "operatingIncome"]
+    rows = []
+    for ticker, financials in ticker_cache.get_many(_parse_tickers(tickers), "financials").items():
+        if isinstance(financials, Exception) or financials is None or financials.empty:
+            rows.append(_error_row(ticker, len(columns)))
+            continue
+        latest = financials.columns[0]
+        row = [ticker, getattr(latest, "year", latest)]
+        for label in ("Total Revenue", "Net Income", "Operating Income"):
+            row.append(financials.at[label, latest] if label in financials.index else None)
+        rows.append(row)
+    return _table(columns, rows)
+
+def compare_company_profiles_fn(tickers: str) -> str:
+    """Returns name, sector, industry and website for several tickers."""
+    columns = ["ticker", "name", "sector", "industry", "website"]
+    rows = []
+    for ticker, info in ticker_cache.get_many(_parse_tickers(tickers), "profile").items():
+        if isinstance(info, Exception) or not info:
+            rows.append(_error_row(ticker, len(columns)))
+            continue
+        rows.append([ticker, info.get("longName"), info.get("sector"), info.get("industry"), info.get("website")])
+    return _table(columns, rows)
+
 class AutoFormattingAgentWrapper:
     """Wraps a LangChain agent and automatically formats output."""
 
@@ -164,8 +212,17 @@ def create_stock_agent(llm):
     get_stock_price = Tool.from_function(name="get_stock_price", func=get_stock_price_fn, description="Get live stock price and intraday summary for a ticker")
     get_stock_financials = Tool.from_function(name="get_stock_financials", func=get_stock_financials_fn, description="Return key financial statement rows for a ticker")
     get_company_profile = Tool.from_function(name="get_company_profile", func=get_company_profile_fn, description="Get company profile information (sector, industry, summary)")
+    get_price_indicators = Tool.from_function(name="get_price_indicators", func=get_price_indicators_fn, description="Get price trend indicators for a ticker: 1w-1y and YTD returns, 20/50/200-day moving averages, volatility, max and current drawdown over the last year")
     
-    tools = [get_stock_price, get_stock_financials, get_company_profile]
+    compare_stock_prices = Tool.from_function(name="compare_stock_prices", func=compare_stock_prices_fn, description="Compare live stock prices of several tickers in one call. Input: comma-separated tickers, e.g. 'AMD, INTC'")
+    compare_stock_financials = Tool.from_function(name="compare_stock_financials", func=compare_stock_financials_fn, description="Compare latest revenue, net income and operating income of several tickers in one call. Input: comma-separated tickers")
+    compare_company_profiles = Tool.from_function(name="compare_company_profiles", func=compare_company_profiles_fn, description="Compare company profiles (name, sector, industry) of several tickers in one call. Input: comma-separated tickers")
+
+    tools = [
+        get_stock_price, get_stock_financials, get_company_profile, get_price_indicators,
+        compare_stock_prices, compare_stock_financials, compare_company_profiles,
+    ]
+    tools = [tool_executor.wrap(t) for t in tools]
 
     agent = create_agent(
         model=llm,
@@ -207,5 +264,6 @@ st.sidebar.write("""
 - Stock Price: What's the current stock price of AAPL?
 - Stock Financial: What are the key financial metrics for MSFT?
 - Comapny Profile: Provide a company profile for NVDA.
+- Price Trend: How has TSLA performed over the last year?
 - Compare the fundamentals of AMD vs INTC.
 """)
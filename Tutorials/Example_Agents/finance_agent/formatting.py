@@ -0,0 +1,148 @@
+"""
+Formats the finance agent's final answer for display.
+
+Merged words ("NetIncomewas", "281.72billion") are split in a single regex
+pass, whitespace is collapsed, and one scan over a lowercased copy picks up the
+"<metric> ... <value> billion" pairs. Patterns are compiled once at import.
+Every boundary that needs a space involves an uppercase letter or a digit, so
+the spacing pattern starts on those: the regex engine can skip over all other
+characters without trying a match, which is where the previous four re.sub
+passes spent most of their time.
+
+Run this file to benchmark it against the previous version.
+"""
+import re
+from typing import Dict, List, Tuple
+
+# An uppercase letter or digit that needs a space before and/or after it:
+# lower→Upper (NetIncome), letter→digit (FY2024) and digit→letter (72billion)
+_BOUNDARY = re.compile(
+    r"[A-Z0-9](?:"
+    r"(?<=[A-Za-z][0-9])(?=[A-Za-z])(?P<both>)"
+    r"|(?:(?<=[a-z][A-Z])|(?<=[A-Za-z][0-9]))(?P<before>)"
+    r"|(?<=[0-9])(?=[A-Za-z])(?P<after>)"
+    r")"
+)
+_PADDING = {"both": " {} ", "before": " {}", "after": "{} "}
+
+# Matched against lowercased text, which is much faster than re.IGNORECASE
+_METRIC = re.compile(r"(revenue|net income|operating income)[^\d]*([\d.,]+)\s*billion")
+_FINANCIAL_KEYWORDS = ("revenue", "net income", "operating income", "financial")
+
+
+def _pad(match: "re.Match") -> str:
+    return _PADDING[match.lastgroup].format(match.group())
+
+
+def normalize_text(text: str) -> str:
+    """Splits merged words and numbers, and collapses whitespace."""
+    return " ".join(_BOUNDARY.sub(_pad, text).split())
+
+
+def extract_metrics(text: str) -> Tuple[bool, Dict[str, List[float]]]:
+    """
+    Returns (is_financial, {"Revenue": [198.27, 281.72], ...}) from normalized text.
+    """
+    lowered = text.lower()
+    if not any(k in lowered for k in _FINANCIAL_KEYWORDS):
+        return False, {}
+    metrics: Dict[str, List[float]] = {}
+    for label, value in _METRIC.findall(lowered):
+        try:
+            number = float(value.replace(",", ""))
+        except ValueError:
+            continue
+        metrics.setdefault(label.title(), []).append(number)
+    return True, metrics
+
+
+def clean_and_format_output(text: str) -> str:
+
+    if not text:
+        return "No output generated."
+
+    text = normalize_text(text)
+    is_financial, metrics_dict = extract_metrics(text)
+
+    # --- If not financial, return raw cleaned text ---
+    if not is_financial:
+        return f"### 📝 Summary\n• {text}"
+
+    # If no metrics detected → fallback
+    if not metrics_dict:
+        return f"### 📈 Financial Metrics\n• {text}"
+
+    # ----------- Generate narrative bullet points -----------
+    bullets = []
+
+    for metric, values in metrics_dict.items():
+        if len(values) >= 2:
+            bullets.append(
+                f"• {metric} increased from {values[0]} billion to {values[-1]} billion."
+            )
+        else:
+            bullets.append(f"• {metric}: {values[0]} billion.")
+
+    return "### 📈 Financial Metrics\n" + "\n".join(bullets)
+
+
+# -----------------------------
+# Benchmark
+# -----------------------------
+def _previous_clean_and_format_output(text: str) -> str:
+    """The multi-pass formatter this module replaced, kept for the benchmark."""
+    if not text:
+        return "No output generated."
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", text)
+    text = re.sub(r"([0-9])([A-Za-z])", r"\1 \2", text)
+    text = re.sub(r"([A-Za-z])([0-9])", r"\1 \2", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    financial_keywords = ["revenue", "net income", "operating income", "financial"]
+    if not any(k in text.lower() for k in financial_keywords):
+        return f"### 📝 Summary\n• {text}"
+    pattern = r"(Revenue|Net Income|Operating Income)[^\d]*([\d.,]+)\s*billion"
+    metrics_dict = {}
+    for label, value in re.findall(pattern, text, flags=re.IGNORECASE):
+        metrics_dict.setdefault(label.title(), []).append(float(value.replace(",", "")))
+    if not metrics_dict:
+        return f"### 📈 Financial Metrics\n• {text}"
+    bullets = []
+    for metric, values in metrics_dict.items():
+        if len(values) >= 2:
+            bullets.append(f"• {metric} increased from {values[0]} billion to {values[-1]} billion.")
+        else:
+            bullets.append(f"• {metric}: {values[0]} billion.")
+    return "### 📈 Financial Metrics\n" + "\n".join(bullets)
+
+
+def _benchmark_corpus(documents: int = 200, seed: int = 0) -> List[str]:
+    import random
+
+    rng = random.Random(seed)
+    fragments = [
+        "The company reported Revenue of {v}billion in FY{y}, while NetIncomewas {v} billion.",
+        "Operating Income reached {v}billion, up from the prior year.",
+        "Analysts   expect\tmargins to stay flat.\n\nGuidance for Q{q} remains unchanged.",
+        "Management highlighted strongdemand for cloud services and AI accelerators.",
+        "The stock trades at {v}x forward earnings with a dividend yield of {q}.{q}%.",
+    ]
+    corpus = []
+    for _ in range(documents):
+        parts = [
+            rng.choice(fragments).format(v=f"{rng.uniform(1, 400):.2f}", y=rng.randint(2019, 2025), q=rng.randint(1, 4))
+            for _ in range(rng.randint(50, 150))
+        ]
+        corpus.append(" ".join(parts))
+    return corpus
+
+
+if __name__ == "__main__":
+    import timeit
+
+    corpus = _benchmark_corpus()
+    mismatches = sum(clean_and_format_output(t) != _previous_clean_and_format_output(t) for t in corpus)
+    size = sum(map(len, corpus))
+    print(f"{len(corpus)} documents, {size / 1e6:.1f} MB, {mismatches} output mismatches")
+    for name, fn in (("previous", _previous_clean_and_format_output), ("single pass", clean_and_format_output)):
+        seconds = min(timeit.repeat(lambda: [fn(t) for t in corpus], number=1, repeat=5))
+        print(f"{name:>12}: {seconds * 1e3:8.1f} ms  ({size / seconds / 1e6:.1f} MB/s)")
@@ -0,0 +1,227 @@
+"""
+Local price history store and trend indicators for the finance agent.
+
+Daily OHLCV history is kept on disk per ticker in a columnar layout: one raw
+binary file per column (date as datetime64[D], prices and volume as float64)
+under <root>/<TICKER>/. New days are appended to the end of each file, so a
+refresh only downloads the days after the last stored one and a load is a
+handful of np.fromfile calls.
+
+The last stored day may be a partial bar fetched during trading hours, so a
+refresh re-fetches and overwrites it. Prices are split/dividend adjusted, and
+an adjustment rewrites past prices: a refresh also re-fetches the day before,
+and if that (final) close no longer matches, rebuilds the ticker from scratch.
+
+compute_indicators turns the history into a few numbers (returns, moving
+averages, volatility, drawdowns) with vectorized NumPy, so the model gets a
+summary instead of thousands of rows.
+"""
+import datetime as dt
+import os
+import shutil
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+COLUMNS = {
+    "date": np.dtype("datetime64[D]"),
+    "open": np.dtype(np.float64),
+    "high": np.dtype(np.float64),
+    "low": np.dtype(np.float64),
+    "close": np.dtype(np.float64),
+    "volume": np.dtype(np.float64),
+}
+TRADING_DAYS = 252
+
+
+class YFinanceHistorySource:
+    """Daily adjusted OHLCV from yfinance."""
+
+    def history(self, ticker: str, start: dt.date) -> Dict[str, np.ndarray]:
+        import yfinance as yf
+
+        df = yf.Ticker(ticker).history(start=start.isoformat(), interval="1d", auto_adjust=True, actions=False)
+        if df is None or df.empty:
+            return {name: np.empty(0, dtype) for name, dtype in COLUMNS.items()}
+        return {
+            "date": np.array(df.index.date, dtype=COLUMNS["date"]),
+            "open": df["Open"].to_numpy(np.float64),
+            "high": df["High"].to_numpy(np.float64),
+            "low": df["Low"].to_numpy(np.float64),
+            "close": df["Close"].to_numpy(np.float64),
+            "volume": df["Volume"].to_numpy(np.float64),
+        }
+
+
+class PriceHistoryStore:
+    def __init__(
+        self,
+        root: str = "./price_history",
+        source: Any = None,
+        history_years: int = 5,
+        refresh_interval: float = 3600.0,
+    ):
+        """
+        Args:
+            root: Directory for the column files.
+            source: Object with history(ticker, start) -> {column: array}. Defaults to YFinanceHistorySource.
+            history_years: How far back the first download of a ticker goes.
+            refresh_interval: Seconds before a ticker is checked for new days again.
+        """
+        self.root = root
+        self.source = source if source is not None else YFinanceHistorySource()
+        self.history_years = history_years
+        self.refresh_interval = refresh_interval
+
+        self._checked: Dict[str, float] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+        self._counters = {"refreshes": 0, "rebuilds": 0, "rows_appended": 0}
+
+    # -----------------------------
+    # Public API
+    # -----------------------------
+    def history(self, ticker: str, refresh: bool = True) -> Dict[str, np.ndarray]:
+        """Stored columns for ticker, after bringing them up to date if refresh is set."""
+        ticker = ticker.strip().upper()
+        with self._lock_for(ticker):
+            if refresh and time.time() - self._checked.get(ticker, 0.0) >= self.refresh_interval:
+                self._refresh(ticker)
+                self._checked[ticker] = time.time()
+            return self._load(ticker)
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self._counters)
+
+    # -----------------------------
+    # Storage
+    # -----------------------------
+    def _dir(self, ticker: str) -> str:
+        return os.path.join(self.root, ticker)
+
+    def _load(self, ticker: str) -> Dict[str, np.ndarray]:
+        directory = self._dir(ticker)
+        columns = {}
+        for name, dtype in COLUMNS.items():
+            path = os.path.join(directory, name)
+            columns[name] = np.fromfile(path, dtype=dtype) if os.path.exists(path) else np.empty(0, dtype)
+        # An interrupted append can leave columns of different lengths; keep the complete rows
+        rows = min(len(c) for c in columns.values())
+        return {name: c[:rows] for name, c in columns.items()}
+
+    def _append(self, ticker: str, new: Dict[str, np.ndarray], rows: int) -> None:
+        directory = self._dir(ticker)
+        os.makedirs(directory, exist_ok=True)
+        for name, dtype in COLUMNS.items():
+            path = os.path.join(directory, name)
+            if os.path.exists(path):
+                # Drop a partial tail left by an interrupted append
+                size = rows * dtype.itemsize
+                if os.path.getsize(path) != size:
+                    with open(path, "r+b") as f:
+                        f.truncate(size)
+            with open(path, "ab") as f:
+                np.ascontiguousarray(new[name], dtype=dtype).tofile(f)
+
+    def _refresh(self, ticker: str) -> None:
+        stored = self._load(ticker)
+        dates = stored["date"]
+        # The last stored bar may be a partial day (fetched while the market was
+        # open), so it is provisional: re-fetched and overwritten on every refresh.
+        # The bar before it is final and serves as the adjustment check.
+        final = len(dates) - 1 if len(dates) else 0
+        if len(dates):
+            start = dates[max(final - 1, 0)].astype(object)
+        else:
+            start = dt.date.today() - dt.timedelta(days=365 * self.history_years)
+        new = self.source.history(ticker, start)
+        self._counters["refreshes"] += 1
+
+        if final and len(new["date"]):
+            overlap = np.flatnonzero(new["date"] == dates[final - 1])
+            if len(overlap) and not np.isclose(new["close"][overlap[0]], stored["close"][final - 1], rtol=1e-6):
+                # Past prices were re-adjusted (split or dividend), start over
+                shutil.rmtree(self._dir(ticker), ignore_errors=True)
+                self._counters["rebuilds"] += 1
+                self._refresh(ticker)
+                return
+
+        if final:
+            keep = new["date"] > dates[final - 1]
+        elif len(dates):
+            keep = new["date"] >= dates[0]
+        else:
+            keep = np.ones(len(new["date"]), dtype=bool)
+        if keep.any():
+            self._append(ticker, {name: col[keep] for name, col in new.items()}, final)
+            self._counters["rows_appended"] += int(keep.sum()) - (len(dates) - final)
+
+    def _lock_for(self, ticker: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(ticker, threading.Lock())
+
+
+# -----------------------------
+# Indicators
+# -----------------------------
+def _moving_average(values: np.ndarray, window: int) -> Optional[float]:
+    if len(values) < window:
+        return None
+    return float(values[-window:].mean())
+
+
+def _period_return(close: np.ndarray, days: int) -> Optional[float]:
+    if len(close) <= days:
+        return None
+    return float(close[-1] / close[-1 - days] - 1.0)
+
+
+def compute_indicators(history: Dict[str, np.ndarray], window: int = TRADING_DAYS) -> Dict[str, Any]:
+    """
+    Summary statistics of a price history. Returns and drawdowns are fractions;
+    volatility is annualized from daily log returns. window (trading days)
+    bounds the volatility, drawdown and high/low figures.
+    """
+    dates, close, volume = history["date"], history["close"], history["volume"]
+    valid = np.isfinite(close) & (close > 0)
+    dates, close, volume = dates[valid], close[valid], volume[valid]
+    if len(close) < 2:
+        return {"error": "Not enough price history."}
+
+    recent = close[-window:]
+    log_returns = np.diff(np.log(recent))
+    peaks = np.maximum.accumulate(recent)
+    drawdowns = recent / peaks - 1.0
+
+    year_start = np.datetime64(f"{dates[-1].astype(object).year}-01-01")
+    before_year = np.flatnonzero(dates < year_start)
+    ytd = float(close[-1] / close[before_year[-1]] - 1.0) if len(before_year) else None
+
+    last = float(close[-1])
+    indicators = {
+        "asOf": str(dates[-1]),
+        "lastClose": last,
+        "return1w": _period_return(close, 5),
+        "return1m": _period_return(close, 21),
+        "return3m": _period_return(close, 63),
+        "return6m": _period_return(close, 126),
+        "return1y": _period_return(close, 252),
+        "returnYtd": ytd,
+        "sma20": _moving_average(close, 20),
+        "sma50": _moving_average(close, 50),
+        "sma200": _moving_average(close, 200),
+        "volatility1m": float(np.std(log_returns[-21:], ddof=1) * np.sqrt(TRADING_DAYS)) if len(log_returns) > 2 else None,
+        "volatility": float(np.std(log_returns, ddof=1) * np.sqrt(TRADING_DAYS)) if len(log_returns) > 2 else None,
+        "maxDrawdown": float(drawdowns.min()),
+        "currentDrawdown": float(drawdowns[-1]),
+        "high": float(recent.max()),
+        "low": float(recent.min()),
+        "avgVolume20d": _moving_average(volume, 20),
+        "days": int(len(recent)),
+    }
+    for name in ("sma20", "sma50", "sma200"):
+        if indicators[name]:
+            indicators[f"priceVs{name.upper()}"] = last / indicators[name] - 1.0
+    return {k: (round(v, 4) if isinstance(v, float) else v) for k, v in indicators.items()}
@@ -0,0 +1,195 @@
+"""
+Shared cache for ticker data used by the finance agent tools.
+
+Every tool call used to create a new yf.Ticker and fetch .info or .financials
+again, so one question about a ticker could trigger several identical slow
+requests. TickerDataCache keeps the results per (ticker, field) with a TTL per
+field (quotes go stale in a minute, profiles and financials last a day), and
+concurrent requests for the same key share a single in-flight fetch.
+
+The data comes from a source object with fetch(ticker, field). YFinanceSource
+talks to Yahoo Finance; LocalSource serves fixed data, for trying the agent or
+the cache without network access.
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+DEFAULT_TTLS = {
+    "quote": 60.0,
+    "profile": 24 * 3600.0,
+    "financials": 24 * 3600.0,
+}
+
+
+class YFinanceSource:
+    """Fetches fields from yfinance. quote and profile both come from Ticker.info."""
+
+    # A fetch of one of these fields also provides the others
+    shared_fields = {"quote": ("profile",), "profile": ("quote",)}
+
+    def fetch(self, ticker: str, field: str) -> Any:
+        import yfinance as yf
+
+        stock = yf.Ticker(ticker)
+        if field in ("quote", "profile"):
+            return stock.info or {}
+        if field == "financials":
+            return stock.financials
+        raise ValueError(f"Unknown field: {field}")
+
+
+class LocalSource:
+    """
+    Serves data from a dict {ticker: {field: value}}, with an optional delay to
+    stand in for network latency. calls counts the fetches per (ticker, field).
+    """
+
+    shared_fields: Dict[str, Tuple[str, ...]] = {}
+
+    def __init__(self, data: Dict[str, Dict[str, Any]], delay: float = 0.0):
+        self.data = {ticker.upper(): fields for ticker, fields in data.items()}
+        self.delay = delay
+        self.calls: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+
+    def fetch(self, ticker: str, field: str) -> Any:
+        with self._lock:
+            self.calls[(ticker, field)] = self.calls.get((ticker, field), 0) + 1
+        if self.delay:
+            time.sleep(self.delay)
+        try:
+            return self.data[ticker][field]
+        except KeyError:
+            raise KeyError(f"No {field} data for {ticker}") from None
+
+
+class TickerDataCache:
+    def __init__(
+        self,
+        source: Any = None,
+        ttls: Optional[Dict[str, float]] = None,
+        max_entries: int = 512,
+        max_concurrent_fetches: Optional[int] = None,
+    ):
+        """
+        Args:
+            source: Object with fetch(ticker, field). Defaults to YFinanceSource.
+            ttls: Seconds each field stays valid, merged over DEFAULT_TTLS.
+            max_entries: Number of (ticker, field) entries kept, least recently used evicted first.
+            max_concurrent_fetches: Cap on source fetches running at once, from any
+                caller or get_many worker. None means no cap.
+        """
+        self.source = source if source is not None else YFinanceSource()
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.max_entries = max_entries
+        self._fetch_slots = threading.BoundedSemaphore(max_concurrent_fetches) if max_concurrent_fetches else None
+
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Any, float]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], Future] = {}
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "coalesced": 0, "errors": 0, "evictions": 0}
+
+    def get(self, ticker: str, field: str) -> Any:
+        """
+        Returns the cached value if fresh, otherwise fetches it. If another thread
+        is already fetching the same key, waits for its result instead. Errors
+        from the source propagate and are not cached.
+        """
+        key = (ticker.strip().upper(), field)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[1] <= self.ttls.get(field, 0):
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                return entry[0]
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+                self._counters["misses"] += 1
+            else:
+                self._counters["coalesced"] += 1
+        if not owner:
+            return future.result()
+
+        try:
+            value = self._fetch(key[0], field)
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+                self._counters["errors"] += 1
+            future.set_exception(e)
+            raise
+
+        fetched = time.time()
+        with self._lock:
+            for name in (field,) + tuple(getattr(self.source, "shared_fields", {}).get(field, ())):
+                self._store((key[0], name), value, fetched)
+            del self._inflight[key]
+        future.set_result(value)
+        return value
+
+    def get_many(self, tickers: Iterable[str], field: str, max_workers: int = 8) -> Dict[str, Any]:
+        """
+        Fetches field for several tickers at once over a bounded thread pool, so a
+        comparison costs about one round trip instead of one per ticker. The
+        fetches still count against max_concurrent_fetches. Returns {TICKER: value},
+        in input order; a failed ticker maps to its exception.
+        """
+        unique = list(dict.fromkeys(t.strip().upper() for t in tickers if t.strip()))
+
+        def fetch(ticker: str) -> Any:
+            try:
+                return self.get(ticker, field)
+            except Exception as e:
+                return e
+
+        if len(unique) <= 1:
+            return {t: fetch(t) for t in unique}
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(unique))) as pool:
+            return dict(zip(unique, pool.map(fetch, unique)))
+
+    def quote(self, ticker: str) -> Any:
+        return self.get(ticker, "quote")
+
+    def profile(self, ticker: str) -> Any:
+        return self.get(ticker, "profile")
+
+    def financials(self, ticker: str) -> Any:
+        return self.get(ticker, "financials")
+
+    def invalidate(self, ticker: Optional[str] = None) -> None:
+        with self._lock:
+            if ticker is None:
+                self._entries.clear()
+                return
+            ticker = ticker.strip().upper()
+            for key in [k for k in self._entries if k[0] == ticker]:
+                del self._entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._counters)
+            lookups = stats["hits"] + stats["misses"] + stats["coalesced"]
+            stats["hit_rate"] = (stats["hits"] + stats["coalesced"]) / lookups if lookups else 0.0
+            stats["entries"] = len(self._entries)
+            stats["inflight"] = len(self._inflight)
+            return stats
+
+    def _fetch(self, ticker: str, field: str) -> Any:
+        if self._fetch_slots is None:
+            return self.source.fetch(ticker, field)
+        with self._fetch_slots:
+            return self.source.fetch(ticker, field)
+
+    def _store(self, key: Tuple[str, str], value: Any, fetched: float) -> None:
+        """Callers hold self._lock."""
+        self._entries[key] = (value, fetched)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1